@@ -1,5 +1,5 @@
 from nonebot import get_plugin_config
-from nonebot import get_bot
+from nonebot import get_bot, get_driver, Bot
 from nonebot.plugin import PluginMetadata
 from nonebot.adapters.onebot.v11 import Message, MessageSegment, Event, MessageEvent
 from nonebot.params import CommandArg
@@ -8,9 +8,26 @@ from nonebot.adapters.onebot.v11.helpers import extract_image_urls
 from nonebot.log import logger
 
 from .config import Config
-from .callSFImg import callSFImg, callSfVLM, callLLM
+from .callSFImg import callSFImg, callSfVLM, callLLM, callDoubaoImage, ApiStatusError
+from .callSFImg import createDoubaoVideoTask, getDoubaoVideoTask, listDoubaoVideoTasks, extractDoubaoVideoUrl
+from .http_client import get_httpx_client, get_aiohttp_session, get_openai_client, close_http_clients
 from .tencent_moderator import TencentTextModerator
-from typing import List
+from .limiter import limiter, async_limiter
+from .redis_client import async_redis_client
+from .cache import TTLCache, TieredCache, ocr_cache
+from .singleflight import SingleFlight
+from .llm_router import Endpoint, LatencyStats, LLMRouter, llm_router
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker, breaker_for
+from .scheduler import Scheduler, SchedulerBusy, scheduler, HIGH, NORMAL, LOW
+from .image_fetcher import CachedImage, ImageFetcher, image_fetcher
+from .executor import run_blocking, run_blocking_in, shutdown_executor
+from .image_preprocess import prepare_image, preprocess_stats
+from .downloader import DownloadError, DownloadedImage, download_image
+from .poller import Backoff, Pending, PollTimeout, parse_retry_after, poll, poll_stats, record_poll
+from .keyword_matcher import KeywordMatcher, keyword_matcher, normalize
+from .prefilter import MessageFeatures, MessagePrefilter, PREFILTER_KEY, prefilter, prefilter_rule
+from nonebot.message import run_postprocessor
+from typing import List, AsyncIterator, Optional
 
 __plugin_meta__ = PluginMetadata(
     name="common",
@@ -21,6 +38,17 @@ __plugin_meta__ = PluginMetadata(
 
 config = get_plugin_config(Config)
 
+# 进程退出时关闭共享连接池
+get_driver().on_shutdown(close_http_clients)
+get_driver().on_shutdown(async_redis_client.close)
+get_driver().on_shutdown(shutdown_executor)
+
+@run_postprocessor
+async def replySchedulerBusy(bot: Bot, event: Event, exception: Optional[Exception]):
+    """调度器排队已满时立即回复繁忙，无需各插件单独处理"""
+    if isinstance(exception, SchedulerBusy):
+        await bot.send(event, str(exception))
+
 from nonebot.adapters.onebot.v11 import MessageEvent, MessageSegment
 
 def splitTextToChunks(text: str, chunk_size: int = 2048) -> List[str]:
@@ -42,32 +70,53 @@ def wrapMessageForward(title: str, texts: List[str]):
     return msgs
 
 from nonebot import Bot
+import re
 import json
 import html
-async def autoWrapMessage(bot: Bot, event: MessageEvent, matcher: Matcher, text: str):
-    if len(text) < 114:
+async def autoWrapMessage(bot: Bot, event: MessageEvent, matcher: Matcher, text: str, limit: int = 114):
+    if len(text) < limit:
         await matcher.finish(text, at_sender=True)
     else:
         texts = splitTextToChunks(text)
         msgs = wrapMessageForward(f"to {event.get_user_id()}", texts)
         await bot.call_api("send_group_forward_msg", group_id=event.group_id, messages=msgs)
 
-import httpx
-import base64
-async def get_image_data_url(img_url: str) -> str:
-    """将图片URL转换为base64格式的data URL"""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(img_url)
-        response.raise_for_status()
-        img_data = response.content
+SENTENCE_END = re.compile(r"[。！？!?；;\n]")
 
-        # 获取图片类型（默认为jpeg）
-        content_type = response.headers.get('Content-Type', 'image/jpeg')
-        img_type = content_type.split('/')[-1]
+async def autoWrapMessageStream(bot: Bot, event: MessageEvent, matcher: Matcher, chunks: AsyncIterator[str],
+                                prefix: str = "", limit: int = 114, min_chars: int = 50):
+    """autoWrapMessage 的流式版本
 
-        # 创建data URL
-        img_base64 = base64.b64encode(img_data).decode('utf-8')
-        return f"data:image/{img_type};base64,{img_base64}"
+    累计超过min_chars且出现句子边界时立即发出第一段，剩余内容在流结束后
+    作为后续消息发送（过长则打包为合并转发）。整段回复较短时与autoWrapMessage一致。
+    """
+    body = ""
+    sent = 0
+    async for chunk in chunks:
+        body += chunk
+        if sent == 0 and len(body.lstrip()) > min_chars:
+            match = SENTENCE_END.search(body, len(body) - len(body.lstrip()) + min_chars)
+            if match:
+                sent = match.end()
+                await matcher.send(prefix + body[:sent].strip(), at_sender=True)
+
+    if sent == 0:
+        await autoWrapMessage(bot, event, matcher, prefix + body.strip(), limit=limit)
+        return
+
+    rest = body[sent:].strip()
+    if not rest:
+        await matcher.finish()
+    if len(rest) < limit:
+        await matcher.finish(rest)
+    else:
+        texts = splitTextToChunks(rest)
+        msgs = wrapMessageForward(f"to {event.get_user_id()}", texts)
+        await bot.call_api("send_group_forward_msg", group_id=event.group_id, messages=msgs)
+
+async def get_image_data_url(img_url: str) -> str:
+    """将图片URL转换为base64格式的data URL（经 image_fetcher 缓存）"""
+    return await image_fetcher.data_url(img_url)
 
 
 async def extract_image_data_url(event: MessageEvent) -> str:
@@ -195,5 +244,13 @@ async def extract_text(event: MessageEvent, forward_limit: int = 1) -> (str, str
 
     return (text, replyText)
 
-__all__ = ["autoWrapMessage", "wrapMessageForward", "splitTextToChunks", "callSFImg", "callSfVLM", "callLLM",
-"get_image_data_url", "extract_image_data_url", "extract_text", "TencentTextModerator"]
+__all__ = ["autoWrapMessage", "autoWrapMessageStream", "wrapMessageForward", "splitTextToChunks", "callSFImg", "callSfVLM", "callLLM",
+"callDoubaoImage", "ApiStatusError", "createDoubaoVideoTask", "getDoubaoVideoTask", "listDoubaoVideoTasks",
+"extractDoubaoVideoUrl", "get_image_data_url", "extract_image_data_url", "extract_text", "TencentTextModerator",
+"get_httpx_client", "get_aiohttp_session", "get_openai_client", "limiter", "async_limiter",
+"TTLCache", "TieredCache", "SingleFlight", "Endpoint", "LatencyStats", "LLMRouter", "llm_router",
+"CircuitBreaker", "CircuitOpenError", "get_breaker", "breaker_for",
+"Scheduler", "SchedulerBusy", "scheduler", "HIGH", "NORMAL", "LOW",
+"CachedImage", "ImageFetcher", "image_fetcher", "ocr_cache", "run_blocking", "run_blocking_in", "prepare_image", "preprocess_stats",
+"DownloadError", "DownloadedImage", "download_image",
+"Backoff", "Pending", "PollTimeout", "parse_retry_after", "poll", "poll_stats", "record_poll"]
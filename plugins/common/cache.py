@@ -0,0 +1,101 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from .redis_client import AsyncRedisClient, async_redis_client
+
+
+class TTLCache:
+    """进程内的LRU缓存，条目带过期时间，超过maxsize时淘汰最久未使用的条目。
+
+    使用示例:
+        cache = TTLCache(maxsize=256, ttl=600)
+        cache.set('k', 'v')
+        cache.get('k')
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expire_at, value = item
+        if expire_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expire_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expire_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        return self._data.pop(key, None) is not None
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache:
+    """本地 TTLCache 在前、Redis 在后的两级缓存，值需可JSON序列化。
+
+    Redis不可用时退化为纯内存缓存；Redis命中的值会按剩余过期时间回填到本地。
+    """
+
+    def __init__(self, prefix: str, maxsize: int = 256, ttl: int = 600,
+                 redis: Optional[AsyncRedisClient] = async_redis_client):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis if redis is not None and redis.is_available() else None
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not None or not self.redis:
+            return value
+        raw, remaining = await self.redis.get_with_ttl(self._redis_key(key))
+        if raw is None:
+            return None
+        try:
+            value = json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+        # 回填本地时沿用Redis中的剩余过期时间，避免条目在本地比在Redis中存活得更久
+        ttl = self.ttl if remaining is None else min(self.ttl, remaining)
+        if ttl > 0:
+            self.local.set(key, value, ttl=ttl)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl=ttl)
+        if self.redis:
+            await self.redis.set(self._redis_key(key), json.dumps(value, ensure_ascii=False), ex=int(ttl))
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+        if self.redis:
+            await self.redis.delete(self._redis_key(key))
+
+
+# OCR结果按图片内容SHA-256缓存，同一张截图在不同群反复识别时不再上传、计费
+OCR_CACHE_TTL = 7 * 24 * 3600
+ocr_cache = TieredCache("ocr_cache", maxsize=1024, ttl=OCR_CACHE_TTL)
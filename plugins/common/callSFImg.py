@@ -1,28 +1,84 @@
 import os
-import aiohttp
+import json
 import asyncio
-from openai import AsyncOpenAI
+import hashlib
+from .http_client import get_aiohttp_session, get_openai_client
+from .singleflight import SingleFlight
+from .llm_router import Endpoint, llm_router, to_base_url
+from .circuit_breaker import breaker_for
+from .image_preprocess import prepare_image
+from .poller import parse_retry_after
 
-async def callDoubaoVideo(prompt, image_url=None, model="doubao-seedance-1-0-pro-250528"):
+_llm_flight = SingleFlight()
+
+
+class ApiStatusError(Exception):
+    """Upstream API answered with a non-2xx status.
+
+    `status` lets the circuit breaker tell client errors (4xx) from backend failures (5xx);
+    `retry_after` carries the Retry-After header, if any, in seconds.
     """
-    Call Doubao (Volcengine Ark) video generation API
-    
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+async def _requestJson(method, url, **kwargs):
+    """
+    Send a request through the shared aiohttp session and return the parsed JSON body.
+
+    Only 5xx responses, timeouts and connection errors are raised inside the host's
+    circuit breaker; 4xx responses and body parsing are handled after leaving it, so a
+    bad prompt or a refused image does not count against the whole host.
+
+    Raises:
+        ApiStatusError: on 4xx responses
+        ValueError: if the body is not JSON
+    """
+    session = get_aiohttp_session()
+    async with breaker_for(url), session.request(method, url, **kwargs) as response:
+        if response.status >= 500:
+            response.raise_for_status()
+        status = response.status
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        body = await response.text()
+
+    try:
+        result = json.loads(body)
+    except ValueError:
+        result = None
+    if status >= 400:
+        err = (result.get("error") or result) if isinstance(result, dict) else body[:200]
+        raise ApiStatusError(f"HTTP {status}: {err}", status, retry_after)
+    if result is None:
+        raise ValueError(f"Invalid JSON response: {body[:200]}")
+    return result
+
+DOUBAO_VIDEO_URL = "https://ark.cn-beijing.volces.com/api/v3/contents/generations/tasks"
+
+
+def _doubaoHeaders():
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {os.getenv('ARK_API_KEY')}"
+    }
+
+
+async def createDoubaoVideoTask(prompt, image_url=None, model="doubao-seedance-1-0-pro-250528"):
+    """
+    Create a Doubao (Volcengine Ark) video generation task
+
     Args:
         prompt (str): The text prompt for video generation
         image_url (str, optional): URL of input image
         model (str): Model to use for generation
-    
+
     Returns:
-        str: The URL of the generated video
+        str: The task id, to be polled with getDoubaoVideoTask / listDoubaoVideoTasks
     """
-    url = "https://ark.cn-beijing.volces.com/api/v3/contents/generations/tasks"
-    token = os.getenv("ARK_API_KEY")
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-    
+    url = DOUBAO_VIDEO_URL
     content = [
         {
             "type": "text", 
@@ -41,49 +97,71 @@ async def callDoubaoVideo(prompt, image_url=None, model="doubao-seedance-1-0-pro
         "content": content
     }
     
-    async with aiohttp.ClientSession() as session:
-        # 1. Create Task
-        async with session.post(url, json=payload, headers=headers) as response:
-            result = await response.json()
-            if "id" not in result:
-                err = result.get("error") or result
-                raise Exception(f"Failed to create video task: {err}")
-            task_id = result["id"]
-            
-        # 2. Poll Task
-        for _ in range(60): # Poll for 5 minutes (5s * 60)
-            await asyncio.sleep(5)
-            async with session.get(f"{url}/{task_id}", headers=headers) as response:
-                result = await response.json()
-                status = result.get("status")
+    result = await _requestJson("POST", url, json=payload, headers=_doubaoHeaders())
+    if "id" not in result:
+        err = result.get("error") or result
+        raise Exception(f"Failed to create video task: {err}")
+    return result["id"]
+
+
+async def getDoubaoVideoTask(task_id):
+    """Fetch the current state of one video task (the raw task object)"""
+    url = DOUBAO_VIDEO_URL
+    return await _requestJson("GET", f"{url}/{task_id}", headers=_doubaoHeaders())
+
+
+async def listDoubaoVideoTasks(task_ids):
+    """
+    Fetch the state of many video tasks in one request
+
+    Returns:
+        dict: task id -> raw task object, for the tasks the API returned
+    """
+    url = DOUBAO_VIDEO_URL
+    params = [("filter.task_ids", task_id) for task_id in task_ids]
+    params.append(("page_size", str(max(1, len(task_ids)))))
+    result = await _requestJson("GET", url, params=params, headers=_doubaoHeaders())
+    if "items" not in result:
+        err = result.get("error") or result
+        raise Exception(f"Failed to list video tasks: {err}")
+    return {item["id"]: item for item in result["items"] or [] if "id" in item}
+
+
+def extractDoubaoVideoUrl(result):
+    """
+    Interpret a task object: return the video URL when succeeded, None while still running,
+    raise when the task failed
+    """
+    status = result.get("status")
+
+    if status == "succeeded":
+        # Try to find video URL in common locations
+        content = result.get("content")
+        if isinstance(content, list) and content:
+            # Check for video_url in the list items
+            for item in content:
+                if "video_url" in item:
+                    return item["video_url"]
+                if "url" in item: # Fallback
+                    return item["url"]
+        elif isinstance(content, dict):
+            if "video_url" in content:
+                return content["video_url"]
+            if "url" in content:
+                return content["url"]
                 
-                if status == "succeeded":
-                    # Try to find video URL in common locations
-                    content = result.get("content")
-                    if isinstance(content, list) and content:
-                        # Check for video_url in the list items
-                        for item in content:
-                            if "video_url" in item:
-                                return item["video_url"]
-                            if "url" in item: # Fallback
-                                return item["url"]
-                    elif isinstance(content, dict):
-                        if "video_url" in content:
-                            return content["video_url"]
-                        if "url" in content:
-                            return content["url"]
-                            
-                    # If we can't find it easily, return the whole content or raise
-                    if content:
-                        return str(content)
-                        
-                    raise Exception("Video generated but URL not found in response")
-                    
-                elif status == "failed":
-                    err = result.get("error") or result
-                    raise Exception(f"Video generation failed: {err}")
-                    
-        raise Exception("Video generation timed out")
+        # If we can't find it easily, return the whole content or raise
+        if content:
+            return str(content)
+            
+        raise Exception("Video generated but URL not found in response")
+        
+    elif status in ("failed", "cancelled", "expired"):
+        err = result.get("error") or result
+        raise Exception(f"Video generation failed: {err}")
+
+    return None
+
 
 async def callDoubaoImage(prompt, model="doubao-seedream-4-0-250828", image_url=None,
                           url="https://ark.cn-beijing.volces.com/api/v3",
@@ -110,22 +188,20 @@ async def callDoubaoImage(prompt, model="doubao-seedream-4-0-250828", image_url=
     if not image_url:
         extra_body["image"] = image_url
         
-    client = AsyncOpenAI(
-        api_key=token,
-        base_url=url,
-    )
+    client = get_openai_client(url, token)
     
-    try:
-        response = await client.images.generate(
-            model=model,
-            prompt=prompt,
-            size="2K",
-            response_format="url",
-            extra_body=extra_body
-        )
-        return response.data[0].url
-    except Exception as e:
-        raise Exception(f"Invalid response from Doubao Image API: {e}")
+    async with breaker_for(url):
+        try:
+            response = await client.images.generate(
+                model=model,
+                prompt=prompt,
+                size="2K",
+                response_format="url",
+                extra_body=extra_body
+            )
+            return response.data[0].url
+        except Exception as e:
+            raise Exception(f"Invalid response from Doubao Image API: {e}")
 
 async def callSFImg(prompt, model="Qwen/Qwen-Image-Edit-2509", image=None):
     """
@@ -158,19 +234,17 @@ async def callSFImg(prompt, model="Qwen/Qwen-Image-Edit-2509", image=None):
         "Content-Type": "application/json"
     }
     
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            result = await response.json()
-            
-            if "images" not in result or not result["images"] or "url" not in result["images"][0]:
-                raise Exception("No image found in response")
-            
-            return result["images"][0]["url"]
+    result = await _requestJson("POST", url, json=payload, headers=headers)
+
+    if "images" not in result or not result["images"] or "url" not in result["images"][0]:
+        raise Exception("No image found in response")
+
+    return result["images"][0]["url"]
 
 async def callSfVLM(prompt, image_urls=None, model="deepseek-ai/DeepSeek-OCR", 
 img_field="image_url", txt_field="text", 
 url = "https://api.siliconflow.cn/v1",
-token = os.getenv("SF_API_KEY")):
+token = os.getenv("SF_API_KEY"), task="vision"):
     """
     Call SiliconFlow's chat/completions API for VLM/visual-language interactions.
     Build a single user message whose "content" is a list of content blocks:
@@ -179,6 +253,8 @@ token = os.getenv("SF_API_KEY")):
 
     This function returns the OCR result as a plain string by extracting all
     "text" blocks from the assistant's content and concatenating them.
+
+    (url, model) is the primary endpoint; fallbacks for `task` come from llm_router.
     """
 
     # build content blocks: text first (if provided), then image blocks
@@ -194,6 +270,8 @@ token = os.getenv("SF_API_KEY")):
         else:
             raise TypeError("image_urls must be str or list/tuple of str")
 
+        # downscale/recompress inline images to the model's max edge before upload
+        image_list = await asyncio.gather(*(prepare_image(img_url, model) for img_url in image_list))
         for img_url in image_list:
             content_blocks.append({
                 "type": "image_url",
@@ -205,95 +283,108 @@ token = os.getenv("SF_API_KEY")):
 
     messages = [{"role": "user", "content": content_blocks}]
 
+    return await llm_router.call(task, lambda endpoint: _postVLM(endpoint, messages),
+                                 primary=Endpoint(to_base_url(url), model, token))
+
+
+async def _postVLM(endpoint: Endpoint, messages):
     payload = {
-        "model": model,
+        "model": endpoint.model,
         "messages": messages
     }
 
     headers = {
-        "Authorization": f"Bearer {token}",
+        "Authorization": f"Bearer {endpoint.token}",
         "Content-Type": "application/json"
     }
 
-    url = url + "/chat/completions"
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            result = await response.json()
-
-            if "choices" in result and result["choices"]:
-                choice = result["choices"][0]
-
-                # Try to get assistant message content in common locations
-                message = None
-                if "message" in choice:
-                    message = choice["message"]
-                elif "content" in choice:
-                    message = {"content": choice["content"]}
-                elif "delta" in choice:
-                    message = {"content": choice["delta"]}
-
-                content = None
-                if isinstance(message, dict) and "content" in message:
-                    content = message["content"]
-                elif isinstance(choice.get("message"), str):
-                    # fallback: raw string message
-                    return choice["message"]
-
-                # If content is a list of content-blocks, collect text blocks
-                if isinstance(content, list):
-                    texts = []
-                    for blk in content:
-                        if not isinstance(blk, dict):
-                            continue
-                        # block may be {"type":"text","text":"..."}
-                        if blk.get("type") == "text":
-                            t = blk.get("text") or blk.get("content") or ""
-                            if t:
-                                texts.append(t)
-                        # sometimes assistant returns {"type":"response","content":"..."} etc.
-                        elif "text" in blk:
-                            t = blk.get("text")
-                            if t:
-                                texts.append(t)
-                        elif "content" in blk and isinstance(blk["content"], str):
-                            texts.append(blk["content"])
-
-                    if texts:
-                        return "".join(texts)
-
-                # If content is a plain string, return it
-                if isinstance(content, str):
-                    return content
-
-                # Last fallback: try to extract text fields from choice directly
-                for key in ("text", "ocr", "result"):
-                    val = choice.get(key)
-                    if isinstance(val, str) and val.strip():
-                        return val
-
-                # If nothing parsed, return the whole choice for debugging
-                return choice
-
-            err = result.get("error") or result
-            raise Exception(f"Invalid response from SF VLM API: {err}")
+    url = endpoint.base_url + "/chat/completions"
+
+    result = await _requestJson("POST", url, json=payload, headers=headers)
+
+    if "choices" in result and result["choices"]:
+        choice = result["choices"][0]
+
+        # Try to get assistant message content in common locations
+        message = None
+        if "message" in choice:
+            message = choice["message"]
+        elif "content" in choice:
+            message = {"content": choice["content"]}
+        elif "delta" in choice:
+            message = {"content": choice["delta"]}
+
+        content = None
+        if isinstance(message, dict) and "content" in message:
+            content = message["content"]
+        elif isinstance(choice.get("message"), str):
+            # fallback: raw string message
+            return choice["message"]
+
+        # If content is a list of content-blocks, collect text blocks
+        if isinstance(content, list):
+            texts = []
+            for blk in content:
+                if not isinstance(blk, dict):
+                    continue
+                # block may be {"type":"text","text":"..."}
+                if blk.get("type") == "text":
+                    t = blk.get("text") or blk.get("content") or ""
+                    if t:
+                        texts.append(t)
+                # sometimes assistant returns {"type":"response","content":"..."} etc.
+                elif "text" in blk:
+                    t = blk.get("text")
+                    if t:
+                        texts.append(t)
+                elif "content" in blk and isinstance(blk["content"], str):
+                    texts.append(blk["content"])
+
+            if texts:
+                return "".join(texts)
+
+        # If content is a plain string, return it
+        if isinstance(content, str):
+            return content
+
+        # Last fallback: try to extract text fields from choice directly
+        for key in ("text", "ocr", "result"):
+            val = choice.get(key)
+            if isinstance(val, str) and val.strip():
+                return val
+
+        # If nothing parsed, return the whole choice for debugging
+        return choice
+
+    err = result.get("error") or result
+    raise Exception(f"Invalid response from SF VLM API: {err}")
 
 
 async def callLLM(prompt, model="z-ai/glm-4.5-air:free", json_output=False, url="http://170.106.83.133:8999/v1/chat/completions",
-    token="sk-1234567"):
+    token="sk-1234567", task="chat"):
     """
     Args:
         prompt (str): The text prompt for LLM
         model (str): Model to use, defaults to "deepseek-ai/deepseek-chat"
         json_output (bool): Whether to request JSON output format
+        task (str): Task class used by llm_router to pick fallback endpoints
 
     Returns:
         str: The LLM response text
+
+    Identical concurrent calls share one upstream request.
     """
+    key = (url, model, json_output, hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    primary = Endpoint(to_base_url(url), model, token)
+    return await _llm_flight.do(key, lambda: llm_router.call(
+        task, lambda endpoint: _postLLM(endpoint, prompt, json_output), primary=primary))
+
+
+async def _postLLM(endpoint: Endpoint, prompt, json_output):
     messages = [{"role": "user", "content": prompt}]
 
     payload = {
-        "model": model,
+        "model": endpoint.model,
         "messages": messages
     }
 
@@ -302,18 +393,18 @@ async def callLLM(prompt, model="z-ai/glm-4.5-air:free", json_output=False, url=
         payload["response_format"] = {"type": "json_object"}
 
     headers = {
-        "Authorization": f"Bearer {token}",
+        "Authorization": f"Bearer {endpoint.token}",
         "Content-Type": "application/json"
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            result = await response.json()
+    url = endpoint.base_url + "/chat/completions"
+
+    result = await _requestJson("POST", url, json=payload, headers=headers)
 
-            if "choices" in result and result["choices"]:
-                choice = result["choices"][0]
-                if "message" in choice and "content" in choice["message"]:
-                    return choice["message"]["content"]
+    if "choices" in result and result["choices"]:
+        choice = result["choices"][0]
+        if "message" in choice and "content" in choice["message"]:
+            return choice["message"]["content"]
 
-            err = result.get("error") or result
-            raise Exception(f"Invalid response from LLM API: {err}")
\ No newline at end of file
+    err = result.get("error") or result
+    raise Exception(f"Invalid response from LLM API: {err}")
\ No newline at end of file
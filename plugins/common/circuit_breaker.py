@@ -0,0 +1,138 @@
+import os
+import time
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 默认阈值，可通过环境变量覆盖
+FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+RECOVERY_TIMEOUT = float(os.environ.get("CIRCUIT_RECOVERY_TIMEOUT", "30"))
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"服务 {name} 暂时不可用，请{int(retry_after) + 1}秒后再试")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """从 httpx / aiohttp / openai 的异常（或其包装异常的原因）中取出HTTP状态码"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        for status in (getattr(exc, "status_code", None), getattr(exc, "status", None),
+                       getattr(getattr(exc, "response", None), "status_code", None)):
+            if isinstance(status, int):
+                return status
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """只有5xx、超时、连接错误等才算后端故障；4xx是请求本身的问题（链接错误、内容被拒等），不计入熔断"""
+    status = _status_code(exc)
+    return status is None or status >= 500
+
+
+class CircuitBreaker:
+    """单个后端的熔断器（closed / open / half_open）。
+
+    连续失败达到 failure_threshold 次后打开，recovery_timeout 秒内的请求直接抛出
+    CircuitOpenError；4xx响应不计为失败。之后进入半开状态，放行最多 half_open_max_calls 个探测请求，
+    探测成功则关闭，失败则重新打开。
+
+    使用示例:
+        async with get_breaker("api.siliconflow.cn"):
+            resp = await client.post(...)
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 recovery_timeout: float = RECOVERY_TIMEOUT, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+        return False
+
+    def record_success(self):
+        self._state = CLOSED
+        self._failures = 0
+        self._half_open_calls = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                print(f"Circuit {self.name} opened after {self._failures} failures")
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def _release(self):
+        if self._state == HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    async def __aenter__(self):
+        if not self.allow():
+            retry_after = max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(self.name, retry_after)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.record_success()
+        elif issubclass(exc_type, asyncio.CancelledError):
+            # 调用方取消不代表后端故障
+            self._release()
+        elif is_backend_failure(exc):
+            self.record_failure()
+        else:
+            # 后端正常返回了4xx，说明服务可用；异常照常抛给调用方
+            self.record_success()
+        return False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """按名称获取（或创建）熔断器，kwargs 仅在首次创建时生效"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+    return breaker
+
+
+def breaker_for(url: str, **kwargs) -> CircuitBreaker:
+    """按URL的host获取熔断器，同一后端的所有接口共享熔断状态"""
+    return get_breaker(urlsplit(url).netloc or url, **kwargs)
+
+
+def breaker_states() -> Dict[str, str]:
+    return {name: breaker.state for name, breaker in _breakers.items()}
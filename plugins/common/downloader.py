@@ -0,0 +1,113 @@
+import os
+import base64
+import hashlib
+from typing import Iterable, List, Optional
+
+from .http_client import get_httpx_client
+
+
+# 默认阈值，可通过环境变量覆盖
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+ALLOWED_IMAGE_TYPES = frozenset({
+    "image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp", "image/bmp",
+})
+
+# 未声明类型（或声明为二进制流）时按文件头识别
+_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+_UNDECLARED_TYPES = ("", "application/octet-stream", "binary/octet-stream")
+
+
+class DownloadError(Exception):
+    """图片下载被拒绝：状态码异常、类型不在白名单或超过大小上限"""
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, content_type in _MAGIC:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+
+class DownloadedImage:
+    """流式下载的结果：base64正文、内容SHA-256、MIME类型与原始大小"""
+
+    __slots__ = ("content_type", "base64", "digest", "size")
+
+    def __init__(self, content_type: str, base64_data: str, digest: str, size: int):
+        self.content_type = content_type
+        self.base64 = base64_data
+        self.digest = digest
+        self.size = size
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.content_type};base64,{self.base64}"
+
+
+class _ImageSink:
+    """逐块接收响应体：检查类型与大小，增量计算SHA-256和base64"""
+
+    def __init__(self, declared_type: Optional[str], content_length: Optional[str],
+                 max_bytes: int, allowed_types: Iterable[str]):
+        self.max_bytes = max_bytes
+        self.allowed_types = allowed_types
+        self.content_type = (declared_type or "").split(";")[0].strip().lower()
+        if self.content_type not in _UNDECLARED_TYPES and self.content_type not in allowed_types:
+            raise DownloadError(f"不支持的图片类型: {self.content_type}")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise DownloadError(f"图片过大: {int(content_length) // 1024}KB")
+        self.size = 0
+        self._sha = hashlib.sha256()
+        self._parts: List[str] = []
+        self._tail = b""
+
+    def feed(self, chunk: bytes):
+        if self.size == 0 and self.content_type in _UNDECLARED_TYPES:
+            sniffed = sniff_image_type(chunk[:16])
+            if sniffed is None or sniffed not in self.allowed_types:
+                raise DownloadError("无法识别的图片格式")
+            self.content_type = sniffed
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise DownloadError(f"图片超过 {self.max_bytes // 1024}KB 上限")
+        self._sha.update(chunk)
+        # base64按3字节对齐编码，余数留到下一块
+        buf = self._tail + chunk
+        cut = len(buf) - len(buf) % 3
+        self._parts.append(base64.b64encode(buf[:cut]).decode("ascii"))
+        self._tail = buf[cut:]
+
+    def finish(self) -> DownloadedImage:
+        if self.size == 0:
+            raise DownloadError("图片内容为空")
+        self._parts.append(base64.b64encode(self._tail).decode("ascii"))
+        content_type = "image/jpeg" if self.content_type == "image/jpg" else self.content_type
+        return DownloadedImage(content_type, "".join(self._parts), self._sha.hexdigest(), self.size)
+
+
+async def download_image(url: str, max_bytes: int = MAX_IMAGE_BYTES,
+                         allowed_types: Iterable[str] = ALLOWED_IMAGE_TYPES) -> DownloadedImage:
+    """流式下载图片，超过max_bytes或类型不符时立即中断，不把整个响应读入内存
+
+    使用示例:
+        image = await download_image(url)
+        image.data_url
+    """
+    async with get_httpx_client().stream("GET", url) as response:
+        response.raise_for_status()
+        sink = _ImageSink(response.headers.get("Content-Type"),
+                          response.headers.get("Content-Length"), max_bytes, allowed_types)
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            sink.feed(chunk)
+    return sink.finish()
+
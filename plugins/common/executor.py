@@ -0,0 +1,42 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+# 图片解码/缩放、同步SDK调用等阻塞操作共用的有界线程池
+BLOCKING_WORKERS = int(os.environ.get("BLOCKING_WORKERS", "4"))
+# 语音合成SDK的单次调用要数秒，单独成池，避免占满共享池拖慢图片处理
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "3"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="dudubot-blocking")
+_pools: Dict[str, ThreadPoolExecutor] = {
+    "tts": ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="dudubot-tts"),
+}
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """在共享线程池中执行阻塞函数，避免卡住事件循环
+
+    使用示例:
+        data = await run_blocking(downscale, raw, 1568)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_blocking_in(pool: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """在指定的专用线程池中执行耗时较长的阻塞调用，池满时排队而不占用共享池
+
+    使用示例:
+        resp = await run_blocking_in("tts", client.TextToVoice, req)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pools[pool], functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
+    for executor in _pools.values():
+        executor.shutdown(wait=False, cancel_futures=True)
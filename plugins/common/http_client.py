@@ -0,0 +1,100 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+import httpx
+from openai import AsyncOpenAI
+
+
+# 连接池参数：保持长连接，限制单个host的并发连接数
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 20
+KEEPALIVE_EXPIRY = 60
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
+
+class HttpClientRegistry:
+    """进程级的HTTP客户端注册表，所有出站请求共享连接池。
+
+    - httpx.AsyncClient: 开启HTTP/2与keep-alive
+    - aiohttp.ClientSession: 复用TCP连接与DNS缓存
+    - AsyncOpenAI: 按 (base_url, api_key) 缓存，底层复用同一个httpx连接池
+
+    使用示例:
+        client = get_httpx_client()
+        resp = await client.get(url, timeout=10)
+    """
+
+    def __init__(self):
+        self._httpx: Optional[httpx.AsyncClient] = None
+        self._aiohttp: Optional[aiohttp.ClientSession] = None
+        self._openai: Dict[Tuple[str, str], AsyncOpenAI] = {}
+
+    def httpx_client(self) -> httpx.AsyncClient:
+        if self._httpx is None or self._httpx.is_closed:
+            limits = httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS_PER_HOST,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            )
+            try:
+                self._httpx = httpx.AsyncClient(http2=True, limits=limits, timeout=DEFAULT_TIMEOUT)
+            except ImportError:
+                # 未安装h2时退回HTTP/1.1
+                self._httpx = httpx.AsyncClient(limits=limits, timeout=DEFAULT_TIMEOUT)
+        return self._httpx
+
+    def aiohttp_session(self) -> aiohttp.ClientSession:
+        # aiohttp的session绑定事件循环，需在协程内首次创建
+        if self._aiohttp is None or self._aiohttp.closed:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS,
+                limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=KEEPALIVE_EXPIRY,
+                ttl_dns_cache=300,
+            )
+            self._aiohttp = aiohttp.ClientSession(connector=connector)
+        return self._aiohttp
+
+    def openai_client(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        key = (base_url or "", api_key or "")
+        client = self._openai.get(key)
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.httpx_client())
+            self._openai[key] = client
+        return client
+
+    async def close(self):
+        """关闭所有连接池，在NoneBot driver shutdown时调用"""
+        self._openai.clear()
+        tasks = []
+        if self._httpx is not None and not self._httpx.is_closed:
+            tasks.append(self._httpx.aclose())
+        if self._aiohttp is not None and not self._aiohttp.closed:
+            tasks.append(self._aiohttp.close())
+        self._httpx = None
+        self._aiohttp = None
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+http_clients = HttpClientRegistry()
+
+
+def get_httpx_client() -> httpx.AsyncClient:
+    """返回共享的 httpx.AsyncClient（HTTP/2 + keep-alive）"""
+    return http_clients.httpx_client()
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """返回共享的 aiohttp.ClientSession，调用方不要关闭它"""
+    return http_clients.aiohttp_session()
+
+
+def get_openai_client(base_url: str, api_key: str) -> AsyncOpenAI:
+    """返回按 (base_url, api_key) 缓存的 AsyncOpenAI 客户端"""
+    return http_clients.openai_client(base_url, api_key)
+
+
+async def close_http_clients():
+    await http_clients.close()
@@ -0,0 +1,94 @@
+import os
+from collections import OrderedDict
+from typing import Optional
+
+from .cache import TTLCache
+from .downloader import download_image
+from .singleflight import SingleFlight
+
+
+# 默认阈值，可通过环境变量覆盖
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_URL_TTL = int(os.environ.get("IMAGE_URL_TTL", "1800"))
+
+
+class CachedImage:
+    """一张已下载的图片：内容SHA-256、MIME类型与对应的data URL"""
+
+    __slots__ = ("digest", "content_type", "data_url")
+
+    def __init__(self, digest: str, content_type: str, data_url: str):
+        self.digest = digest
+        self.content_type = content_type
+        self.data_url = data_url
+
+    @property
+    def size(self) -> int:
+        return len(self.data_url)
+
+
+class ImageFetcher:
+    """带缓存的图片下载器，多人对同一张引用图片调用 imgai/aiimg/totxt 时只下载、编码一次。
+
+    两级索引：URL -> 内容哈希（带TTL），内容哈希 -> CachedImage（按总字节数LRU淘汰）。
+    同一张图片通过不同URL下载时共享同一份缓存，并发的相同URL请求只下载一次。
+
+    使用示例:
+        image = await image_fetcher.fetch(url)
+        image.data_url, image.digest
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES, url_ttl: int = IMAGE_URL_TTL):
+        self.max_bytes = max_bytes
+        self._urls = TTLCache(maxsize=4096, ttl=url_ttl)
+        self._images: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._bytes = 0
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, url: str) -> Optional[CachedImage]:
+        digest = self._urls.get(url)
+        if digest is None:
+            return None
+        image = self._images.get(digest)
+        if image is not None:
+            self._images.move_to_end(digest)
+        return image
+
+    def _store(self, url: str, image: CachedImage) -> CachedImage:
+        existing = self._images.get(image.digest)
+        if existing is not None:
+            # 内容相同的图片只保留一份
+            image = existing
+            self._images.move_to_end(image.digest)
+        elif image.size <= self.max_bytes:
+            self._images[image.digest] = image
+            self._bytes += image.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= evicted.size
+        self._urls.set(url, image.digest)
+        return image
+
+    async def _download(self, url: str) -> CachedImage:
+        downloaded = await download_image(url)
+        image = CachedImage(downloaded.digest, downloaded.content_type, downloaded.data_url)
+        return self._store(url, image)
+
+    async def fetch(self, url: str) -> CachedImage:
+        image = self._lookup(url)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        return await self._flight.do(url, lambda: self._download(url))
+
+    async def data_url(self, url: str) -> str:
+        return (await self.fetch(url)).data_url
+
+    def stats(self) -> dict:
+        return {"images": len(self._images), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+image_fetcher = ImageFetcher()
@@ -0,0 +1,105 @@
+import io
+import os
+import base64
+from typing import Optional, Tuple
+
+from nonebot.log import logger
+
+from .executor import run_blocking
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装Pillow时原样上传
+    Image = None
+
+
+# 默认参数，可通过环境变量覆盖
+IMAGE_MAX_EDGE = int(os.environ.get("IMAGE_MAX_EDGE", "1568"))
+IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "JPEG").upper()  # JPEG / WEBP
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "85"))
+# 小于该大小且边长未超限的图片不处理
+IMAGE_MIN_BYTES = int(os.environ.get("IMAGE_MIN_BYTES", str(256 * 1024)))
+
+# 各模型的最长边上限；OCR类模型需要保留更多细节
+MODEL_MAX_EDGE = {
+    "deepseek-ai/DeepSeek-OCR": 2048,
+    "hunyuan-turbos-vision-20250619": 1536,
+    "google/gemini-3-pro-image-preview": 2048,
+    "gemini-3-pro-image-preview": 2048,
+    "gemini-2.5-flash-image-preview": 2048,
+}
+
+bytes_in = 0
+bytes_out = 0
+
+
+def max_edge_for(model: Optional[str]) -> int:
+    return MODEL_MAX_EDGE.get(model or "", IMAGE_MAX_EDGE)
+
+
+def _split_data_url(data_url: str) -> Optional[Tuple[str, bytes]]:
+    header, sep, payload = data_url.partition(",")
+    if not sep or not header.startswith("data:") or not header.endswith(";base64"):
+        return None
+    return header[5:-7], base64.b64decode(payload)
+
+
+def downscale(data: bytes, max_edge: int, fmt: str = IMAGE_FORMAT,
+              quality: int = IMAGE_QUALITY) -> Optional[Tuple[bytes, str]]:
+    """缩放到最长边不超过max_edge并重新编码，返回 (新数据, MIME类型)；无需处理时返回None"""
+    with Image.open(io.BytesIO(data)) as img:
+        if getattr(img, "is_animated", False):
+            return None
+        if max(img.size) <= max_edge and len(data) <= IMAGE_MIN_BYTES:
+            return None
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            # JPEG不支持透明通道，铺白底
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            rgba = img.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            img = background
+        out = io.BytesIO()
+        img.save(out, format=fmt, quality=quality, optimize=True)
+    return out.getvalue(), f"image/{fmt.lower()}"
+
+
+def _prepare(image_url: str, max_edge: int) -> Tuple[int, Optional[str]]:
+    parsed = _split_data_url(image_url)
+    if parsed is None:
+        return 0, None
+    _, data = parsed
+    result = downscale(data, max_edge)
+    if result is None or len(result[0]) >= len(data):
+        return len(data), None
+    new_data, mime = result
+    return len(data), f"data:{mime};base64,{base64.b64encode(new_data).decode('utf-8')}"
+
+
+async def prepare_image(image_url: str, model: Optional[str] = None) -> str:
+    """上传给视觉模型前预处理data URL图片：按模型缩放并重新压缩，变大或失败时返回原图。
+
+    非data URL（如http链接）原样返回。解码、缩放与编码都在线程池中执行。
+    """
+    global bytes_in, bytes_out
+    if Image is None or not image_url.startswith("data:"):
+        return image_url
+    try:
+        size, prepared = await run_blocking(_prepare, image_url, max_edge_for(model))
+    except Exception as e:
+        logger.warning(f"图片预处理失败，使用原图: {e}")
+        return image_url
+    if prepared is None:
+        return image_url
+
+    # 按base64长度估算二进制大小
+    new_size = len(prepared) * 3 // 4
+    bytes_in += size
+    bytes_out += new_size
+    logger.info(f"图片预处理({model}): {size // 1024}KB -> {new_size // 1024}KB，"
+                f"累计节省 {(bytes_in - bytes_out) // 1024}KB")
+    return prepared
+
+
+def preprocess_stats() -> dict:
+    return {"bytes_in": bytes_in, "bytes_out": bytes_out, "bytes_saved": bytes_in - bytes_out}
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import unicodedata
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from nonebot.log import logger
+
+
+# 关键词配置文件：{"标签": ["关键词", ...]}，文件中的标签覆盖代码中登记的同名默认词表
+KEYWORDS_FILE = os.getenv("KEYWORDS_FILE", "data/keywords.json")
+# 检查配置文件是否修改的最短间隔（秒）
+KEYWORDS_RELOAD_INTERVAL = float(os.getenv("KEYWORDS_RELOAD_INTERVAL", "5"))
+
+# 零宽字符，常被插在敏感词中间规避匹配
+ZERO_WIDTH = "\u200b\u200c\u200d\u2060\ufeff\u00ad\u180e"
+
+# 与拉丁字母形近的西里尔/希腊字母（NFKC不会合并它们）
+HOMOGLYPHS = {
+    "\u0430": "a", "\u0432": "b", "\u0435": "e", "\u0451": "e", "\u043a": "k", "\u043c": "m", "\u043d": "h", "\u043e": "o",
+    "\u0440": "p", "\u0441": "c", "\u0442": "t", "\u0443": "y", "\u0445": "x", "\u0456": "i", "\u0458": "j", "\u0455": "s",
+    "\u0501": "d", "\u051b": "q", "\u051d": "w", "\u03b1": "a", "\u03b2": "b", "\u03b5": "e", "\u03b9": "i", "\u03ba": "k",
+    "\u03bd": "v", "\u03bf": "o", "\u03c1": "p", "\u03c4": "t", "\u03c5": "u", "\u03c7": "x",
+}
+
+_TRANSLATION = str.maketrans({**{ch: None for ch in ZERO_WIDTH}, **HOMOGLYPHS})
+
+
+def normalize(text: str) -> str:
+    """全角/兼容字符经NFKC归一，忽略大小写，去掉零宽字符并把形近字母替换为拉丁字母"""
+    return unicodedata.normalize("NFKC", text).casefold().translate(_TRANSLATION)
+
+
+class _Automaton:
+    """Aho-Corasick 自动机，构建后只读：goto 为每个状态的转移表，out 为到达该状态时命中的标签"""
+
+    __slots__ = ("goto", "fail", "out")
+
+    def __init__(self, patterns: Dict[str, Set[str]]):
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Set[str]] = [set()]
+        for word, tags in patterns.items():
+            node = 0
+            for ch in word:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(set())
+                node = nxt
+            out[node] |= tags
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fail[nxt] = goto[state].get(ch, 0)
+                # 后缀上的词同样命中
+                out[nxt] |= out[fail[nxt]]
+
+        self.goto = goto
+        self.fail = fail
+        self.out: List[FrozenSet[str]] = [frozenset(tags) for tags in out]
+
+    def search(self, text: str) -> FrozenSet[str]:
+        goto, fail, out = self.goto, self.fail, self.out
+        found: Set[str] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return frozenset(found)
+
+
+class KeywordMatcher:
+    """多标签关键词匹配器：所有词表编译为一个 Aho-Corasick 自动机，每条消息只扫描一遍，
+    返回命中的标签集合。文本与关键词使用同样的归一化，全角、大小写、零宽字符和形近字母不影响匹配。
+
+    代码中用 register 登记默认词表；配置文件修改后会在下一次匹配时自动重新加载，无需重启。
+
+    使用示例:
+        keyword_matcher.register("bole.tencent", ["鹅", "腾讯"])
+        keyword_matcher.match("ＴＥＮＣＥＮＴ和腾讯")  # frozenset({"bole.tencent"})
+    """
+
+    def __init__(self, path: Optional[str] = KEYWORDS_FILE, reload_interval: float = KEYWORDS_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._defaults: Dict[str, Set[str]] = {}
+        self._overrides: Dict[str, Set[str]] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._automaton: Optional[_Automaton] = None
+
+    def register(self, tag: str, keywords: Iterable[str]):
+        """登记（或替换）某个标签的默认关键词"""
+        self._defaults[tag] = {normalize(keyword) for keyword in keywords if keyword}
+        self._automaton = None
+
+    def keywords(self) -> Dict[str, Set[str]]:
+        """当前生效的词表：配置文件中的标签覆盖默认词表"""
+        return {**self._defaults, **self._overrides}
+
+    def _maybe_reload(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        if mtime is None:
+            self._overrides = {}
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._overrides = {str(tag): {normalize(word) for word in words if word}
+                                   for tag, words in data.items()}
+            except (OSError, ValueError, AttributeError, TypeError) as e:
+                # 配置写坏时保留上一次的词表
+                logger.error(f"关键词配置 {self.path} 加载失败: {e}")
+                return
+            logger.info(f"已加载关键词配置 {self.path}: {len(self._overrides)} 个标签")
+        self._automaton = None
+
+    def _build(self) -> _Automaton:
+        patterns: Dict[str, Set[str]] = {}
+        for tag, words in self.keywords().items():
+            for word in words:
+                if word:
+                    patterns.setdefault(word, set()).add(tag)
+        return _Automaton(patterns)
+
+    def match(self, text: str, normalized: bool = False) -> FrozenSet[str]:
+        """返回文本命中的标签；normalized 为真时表示文本已经过 normalize"""
+        self._maybe_reload()
+        if self._automaton is None:
+            self._automaton = self._build()
+        if not text:
+            return frozenset()
+        return self._automaton.search(text if normalized else normalize(text))
+
+
+keyword_matcher = KeywordMatcher()
@@ -1,77 +1,228 @@
 import os
 import time
+import uuid
+import threading
 import redis
-from typing import List
+from collections import OrderedDict, deque
+from typing import List, Optional
+
+from .redis_client import get_async_redis_client
+
+KEY_EXPIRE_SECS = 30 * 24 * 3600  # 30 days expiry
+
+# 基于有序集合的滑动窗口，score为时间戳
+# 旧版本使用list存储时间戳，遇到时原地迁移为zset，避免已有额度被清空
+SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local cutoff = tonumber(ARGV[2])
+local max_count = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local member = ARGV[5]
+
+if redis.call('TYPE', key).ok == 'list' then
+    local old = redis.call('LRANGE', key, 0, -1)
+    redis.call('DEL', key)
+    for _, t in ipairs(old) do
+        local ts = tonumber(t)
+        if ts then
+            redis.call('ZADD', key, ts, t)
+        end
+    end
+end
+
+-- ARGV[6..] 为Redis不可用期间本地放行的记录，回写以保持额度一致
+for i = 6, #ARGV do
+    local ts = tonumber(string.match(ARGV[i], '^[^:]+'))
+    if ts then
+        redis.call('ZADD', key, ts, ARGV[i])
+    end
+end
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', cutoff)
+if redis.call('ZCARD', key) >= max_count then
+    return 0
+end
+redis.call('ZADD', key, now, member)
+redis.call('EXPIRE', key, ttl)
+return 1
+"""
+
+
+def _resolve_limit(uid: str, max_count: int, special_users: dict) -> int:
+    # special_users 的键可能是 str 或 int，-1 表示不限
+    if uid in special_users:
+        return special_users[uid]
+    try:
+        uid_int = int(uid)
+        if uid_int in special_users:
+            return special_users[uid_int]
+    except (ValueError, TypeError):
+        pass
+    return max_count
+
+
+def _member(now: float) -> str:
+    # 同一时刻的多次调用需要不同的member
+    return f"{now}:{uuid.uuid4().hex[:8]}"
+
+
+class LocalLimiter:
+    """进程内滑动窗口限流，在未配置REDIS_URL或Redis故障时使用。
+
+    每个key保存一个长度不超过max_count的时间戳环形缓冲，key按LRU淘汰，
+    内存占用有上限。Redis故障期间放行的记录会暂存为pending，
+    待Redis恢复后由 Limiter 回写。
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, deque]" = OrderedDict()
+        self._pending: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _window(self, key: str, max_count: int) -> deque:
+        window = self._windows.get(key)
+        if window is None or window.maxlen != max_count:
+            window = deque(window or (), maxlen=max_count)
+            self._windows[key] = window
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            old_key, _ = self._windows.popitem(last=False)
+            self._pending.pop(old_key, None)
+        return window
+
+    def check(self, key: str, now: float, cutoff: float, max_count: int, pending: bool = False) -> bool:
+        if max_count <= 0:
+            return False
+        with self._lock:
+            window = self._window(key, max_count)
+            while window and window[0] <= cutoff:
+                window.popleft()
+            if len(window) >= max_count:
+                return False
+            window.append(now)
+            if pending:
+                records = self._pending.setdefault(key, [])
+                records.append(_member(now))
+                del records[:-max_count]
+            return True
+
+    def record(self, key: str, now: float, max_count: int):
+        """记录一次Redis放行的调用，使故障切换时本地窗口保持最新"""
+        if max_count <= 0:
+            return
+        with self._lock:
+            self._window(key, max_count).append(now)
+
+    def drain_pending(self, key: str) -> List[str]:
+        with self._lock:
+            return self._pending.pop(key, [])
+
+    def restore_pending(self, key: str, records: List[str]):
+        if not records:
+            return
+        with self._lock:
+            self._pending[key] = records + self._pending.get(key, [])
+
+
+local_limiter = LocalLimiter()
+
 
 class Limiter:
-    def __init__(self):
+    def __init__(self, fallback: Optional[LocalLimiter] = local_limiter):
         self.redis_url = os.environ.get("REDIS_URL")
         self.client = None
+        self._script = None
+        self._fallback = fallback
         if self.redis_url:
             try:
                 self.client = redis.from_url(self.redis_url, decode_responses=True)
+                self._script = self.client.register_script(SLIDING_WINDOW_LUA)
             except Exception as e:
                 print(f"Redis connection failed: {e}")
 
     def check(self, cmd: str, user_id: str, window_mins: float, max_count: int, default: bool = False) -> bool:
-        if not self.client:
-            return default
-        
+        """Redis不可用时切换到本地限流；未配置fallback时返回default"""
         key = f"{cmd}_{user_id}"
         now = time.time()
         cutoff = now - (window_mins * 60)
+
+        if not self._script:
+            return _local_check(self._fallback, key, now, cutoff, max_count, default, pending=False)
         
+        pending = self._fallback.drain_pending(key) if self._fallback else []
         try:
-            # Get all timestamps
-            timestamps = self.client.lrange(key, 0, -1)
-            valid_timestamps = []
-            
-            # Filter old timestamps
-            for t in timestamps:
-                try:
-                    if float(t) > cutoff:
-                        valid_timestamps.append(float(t))
-                except ValueError:
-                    continue
-            
-            # Check if limit reached
-            if len(valid_timestamps) >= max_count:
-                return False
-            
-            # Add new timestamp
-            valid_timestamps.append(now)
-            self._update(key, valid_timestamps)
-            return True
-            
+            # 一次EVALSHA完成清理、计数与写入，并发请求之间是原子的
+            allowed = self._script(keys=[key], args=[now, cutoff, max_count, KEY_EXPIRE_SECS, _member(now), *pending])
         except Exception as e:
             print(f"Limiter error: {e}")
-            return default
+            if self._fallback:
+                self._fallback.restore_pending(key, pending)
+            return _local_check(self._fallback, key, now, cutoff, max_count, default, pending=True)
+
+        if allowed and self._fallback:
+            self._fallback.record(key, now, max_count)
+        return bool(allowed)
 
     def checkWithSpecialUsers(self, cmd: str, user_id: str, window_mins: float, max_count: int, special_users: dict) -> bool:
         uid = str(user_id)
-        limit = max_count
-        
-        if uid in special_users:
-            limit = special_users[uid]
-        else:
-            try:
-                uid_int = int(uid)
-                if uid_int in special_users:
-                    limit = special_users[uid_int]
-            except (ValueError, TypeError):
-                pass
-        
+        limit = _resolve_limit(uid, max_count, special_users)
         if limit == -1:
             return True
 
         return self.check(cmd, uid, window_mins, limit)
 
-    def _update(self, key: str, timestamps: List[float]):
-        pipe = self.client.pipeline()
-        pipe.delete(key)
-        if timestamps:
-            pipe.rpush(key, *timestamps)
-            pipe.expire(key, int(30 * 24 * 3600)) # 30 days expiry
-        pipe.execute()
+
+class AsyncLimiter:
+    """Limiter 的异步版本，基于共享连接池的 redis.asyncio，不阻塞事件循环"""
+
+    def __init__(self, fallback: Optional[LocalLimiter] = local_limiter):
+        self.client = get_async_redis_client()
+        self._script = None
+        self._fallback = fallback
+        if self.client:
+            try:
+                self._script = self.client.register_script(SLIDING_WINDOW_LUA)
+            except Exception as e:
+                print(f"Redis script register failed: {e}")
+
+    async def check(self, cmd: str, user_id: str, window_mins: float, max_count: int, default: bool = False) -> bool:
+        key = f"{cmd}_{user_id}"
+        now = time.time()
+        cutoff = now - (window_mins * 60)
+
+        if not self._script:
+            return _local_check(self._fallback, key, now, cutoff, max_count, default, pending=False)
+
+        pending = self._fallback.drain_pending(key) if self._fallback else []
+        try:
+            allowed = await self._script(keys=[key], args=[now, cutoff, max_count, KEY_EXPIRE_SECS, _member(now), *pending])
+        except Exception as e:
+            print(f"Limiter error: {e}")
+            if self._fallback:
+                self._fallback.restore_pending(key, pending)
+            return _local_check(self._fallback, key, now, cutoff, max_count, default, pending=True)
+
+        if allowed and self._fallback:
+            self._fallback.record(key, now, max_count)
+        return bool(allowed)
+
+    async def checkWithSpecialUsers(self, cmd: str, user_id: str, window_mins: float, max_count: int, special_users: dict) -> bool:
+        uid = str(user_id)
+        limit = _resolve_limit(uid, max_count, special_users)
+        if limit == -1:
+            return True
+
+        return await self.check(cmd, uid, window_mins, limit)
+
+
+def _local_check(fallback: Optional[LocalLimiter], key: str, now: float, cutoff: float, max_count: int,
+                 default: bool, pending: bool) -> bool:
+    if not fallback:
+        return default
+    return fallback.check(key, now, cutoff, max_count, pending=pending)
+
 
 limiter = Limiter()
+async_limiter = AsyncLimiter()
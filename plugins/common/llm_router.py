@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .circuit_breaker import OPEN, breaker_for
+
+
+# 候选还没有足够的延迟统计时使用的hedge延迟，可通过环境变量覆盖
+DEFAULT_HEDGE_DELAY = float(os.environ.get("LLM_DEFAULT_HEDGE_DELAY", "15"))
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """一个可调用的 (接口地址, 模型) 组合，base_url 不含 /chat/completions"""
+    base_url: str
+    model: str
+    token: str = ""
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.base_url}"
+
+
+def to_base_url(url: str) -> str:
+    """兼容传入完整 /chat/completions 地址的调用方"""
+    url = url.rstrip("/")
+    suffix = "/chat/completions"
+    return url[:-len(suffix)] if url.endswith(suffix) else url
+
+
+class LatencyStats:
+    """滚动窗口内的延迟与错误率统计"""
+
+    def __init__(self, window: int = 50):
+        self._samples = deque(maxlen=window)  # (latency, ok)
+        self.last_failure = 0.0
+
+    def record(self, latency: float, ok: bool):
+        self._samples.append((latency, ok))
+        if not ok:
+            self.last_failure = time.monotonic()
+
+    def _percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(lat for lat, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self._percentile(0.5)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self._percentile(0.95)
+
+    @property
+    def samples(self) -> int:
+        return len(self._samples)
+
+    @property
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+
+class LLMRouter:
+    """按任务类别维护有序的候选 (接口, 模型) 池，记录各候选的p50/p95延迟与错误率。
+
+    健康的候选按p50延迟从低到高排序（统计不足的候选保持原有顺序排在前面，主候选优先），
+    错误率过高的候选会被排到后面；
+    当前请求超过该候选的p95（没有统计数据时为 default_hedge_delay）仍未返回时，
+    并发启动下一个候选（hedge），任一成功即返回；失败时立即切换下一个。
+
+    额外的候选池可通过环境变量 LLM_ROUTER_POOLS 配置，例如:
+        {"moderation": [{"base_url": "https://api.siliconflow.cn/v1", "model": "Qwen/Qwen3-8B", "token_env": "SF_API_KEY"}]}
+    """
+
+    def __init__(self, deadline: float = 60, min_samples: int = 5, max_error_rate: float = 0.5,
+                 min_hedge_delay: float = 2, recovery_secs: float = 60,
+                 default_hedge_delay: float = DEFAULT_HEDGE_DELAY):
+        self.deadline = deadline
+        self.recovery_secs = recovery_secs
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self._pools: Dict[str, List[Endpoint]] = {}
+        self._stats: Dict[Endpoint, LatencyStats] = {}
+
+    def register(self, task: str, endpoints: List[Endpoint]):
+        self._pools[task] = list(endpoints)
+
+    def load_env(self, var: str = "LLM_ROUTER_POOLS"):
+        raw = os.environ.get(var)
+        if not raw:
+            return
+        try:
+            pools = json.loads(raw)
+            for task, items in pools.items():
+                self.register(task, [
+                    Endpoint(
+                        base_url=to_base_url(item["base_url"]),
+                        model=item["model"],
+                        token=item.get("token") or os.environ.get(item.get("token_env", ""), ""),
+                    )
+                    for item in items
+                ])
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            print(f"Invalid {var}: {e}")
+
+    def stats(self, endpoint: Endpoint) -> LatencyStats:
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = LatencyStats()
+        return stats
+
+    def _healthy(self, endpoint: Endpoint) -> bool:
+        if breaker_for(endpoint.base_url).state == OPEN:
+            return False
+        stats = self.stats(endpoint)
+        if stats.samples < self.min_samples or stats.error_rate < self.max_error_rate:
+            return True
+        # 降级的候选在一段时间没有新的失败后恢复原有顺序，重新接受检验
+        return time.monotonic() - stats.last_failure > self.recovery_secs
+
+    def candidates(self, task: str, primary: Optional[Endpoint] = None) -> List[Endpoint]:
+        ordered = [primary] if primary else []
+        ordered += [ep for ep in self._pools.get(task, []) if ep != primary]
+        # 稳定排序：健康的候选在前，其中按p50从快到慢；统计不足的候选视为最快，先积累样本
+        return sorted(ordered, key=lambda ep: (not self._healthy(ep), self._rank_latency(ep)))
+
+    def _rank_latency(self, endpoint: Endpoint) -> float:
+        stats = self.stats(endpoint)
+        if stats.samples < self.min_samples:
+            return 0.0
+        p50 = stats.p50
+        return float("inf") if p50 is None else p50
+
+    def best(self, task: str, primary: Optional[Endpoint] = None) -> Optional[Endpoint]:
+        candidates = self.candidates(task, primary)
+        return candidates[0] if candidates else None
+
+    def _hedge_delay(self, endpoint: Endpoint, deadline: float) -> float:
+        stats = self.stats(endpoint)
+        p95 = stats.p95 if stats.samples >= self.min_samples else None
+        if p95 is None:
+            return min(deadline, self.default_hedge_delay)
+        return min(deadline, max(self.min_hedge_delay, p95))
+
+    async def _attempt(self, endpoint: Endpoint, fn: Callable[[Endpoint], Awaitable[Any]]) -> Any:
+        start = time.monotonic()
+        try:
+            result = await fn(endpoint)
+        except asyncio.CancelledError:
+            # 被hedge的其他候选抢先或调用方取消：按已耗时记一次失败，慢候选的统计才会反映出来
+            self.stats(endpoint).record(time.monotonic() - start, False)
+            raise
+        except Exception:
+            self.stats(endpoint).record(time.monotonic() - start, False)
+            raise
+        self.stats(endpoint).record(time.monotonic() - start, True)
+        return result
+
+    async def call(self, task: str, fn: Callable[[Endpoint], Awaitable[Any]],
+                   primary: Optional[Endpoint] = None, deadline: Optional[float] = None) -> Any:
+        """对候选依次/并发调用 fn(endpoint)，返回第一个成功的结果；全部失败时抛出最后一个异常"""
+        candidates = self.candidates(task, primary)
+        if not candidates:
+            raise ValueError(f"No endpoint configured for task {task}")
+        deadline = self.deadline if deadline is None else deadline
+
+        pending: Dict[asyncio.Future, Endpoint] = {}
+        last_error: Optional[BaseException] = None
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            pending[asyncio.ensure_future(self._attempt(endpoint, fn))] = endpoint
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if next_index < len(candidates):
+                    timeout = self._hedge_delay(candidates[next_index - 1], deadline)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超过hedge延迟仍未返回，并发启动下一个候选
+                    launch()
+                    continue
+                result_task = None
+                for task_done in done:
+                    endpoint = pending.pop(task_done)
+                    if task_done.exception() is None:
+                        result_task = result_task or task_done
+                        continue
+                    last_error = task_done.exception()
+                    print(f"LLM endpoint {endpoint.name} failed: {last_error}")
+                if result_task is not None:
+                    return result_task.result()
+                if not pending and next_index < len(candidates):
+                    launch()
+            raise last_error
+        finally:
+            for task_pending in pending:
+                task_pending.cancel()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """各候选当前的统计数据，便于排查"""
+        return {
+            endpoint.name: {
+                "p50": stats.p50,
+                "p95": stats.p95,
+                "error_rate": stats.error_rate,
+                "samples": stats.samples,
+            }
+            for endpoint, stats in self._stats.items()
+        }
+
+
+llm_router = LLMRouter()
+llm_router.load_env()
@@ -0,0 +1,138 @@
+import time
+import random
+import asyncio
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from nonebot.log import logger
+
+
+class PollTimeout(Exception):
+    """超过总期限仍未完成"""
+
+    def __init__(self, name: str, elapsed: float, attempts: int):
+        super().__init__(f"{name} 在 {elapsed:.0f} 秒内（{attempts} 次查询）未完成")
+        self.name = name
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+
+class Pending:
+    """check 返回该对象表示任务仍在进行，可附带服务端建议的下次查询间隔"""
+
+    __slots__ = ("retry_after",)
+
+    def __init__(self, retry_after: Optional[float] = None):
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或HTTP日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Backoff:
+    """指数退避间隔：initial 起每次乘以 factor，不超过 max_interval，并加上 ±jitter 比例的随机抖动。
+
+    服务端给出建议间隔时优先使用（同样受 max_interval 限制）。
+    """
+
+    def __init__(self, initial: float = 2, factor: float = 1.6, max_interval: float = 30, jitter: float = 0.2):
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self._current = initial
+
+    def reset(self):
+        self._current = self.initial
+
+    def next(self, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            delay = min(self.max_interval, retry_after)
+        else:
+            delay = self._current
+            self._current = min(self.max_interval, self._current * self.factor)
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+
+# 最近的轮询记录，按任务名分组：(耗时, 查询次数, 结果)
+_metrics: Dict[str, Deque[tuple]] = {}
+
+
+def record_poll(name: str, elapsed: float, attempts: int, outcome: str):
+    _metrics.setdefault(name, deque(maxlen=100)).append((elapsed, attempts, outcome))
+    logger.info(f"轮询 {name}: {outcome}，耗时 {elapsed:.1f}s，查询 {attempts} 次")
+
+
+def poll_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {}
+    for name, records in _metrics.items():
+        elapsed = sorted(r[0] for r in records)
+        stats[name] = {
+            "count": len(records),
+            "elapsed_p50": elapsed[len(elapsed) // 2],
+            "attempts_avg": sum(r[1] for r in records) / len(records),
+            "outcomes": {o: sum(1 for r in records if r[2] == o) for o in {r[2] for r in records}},
+        }
+    return stats
+
+
+async def poll(check: Callable[[], Awaitable[Any]], name: str = "task", deadline: float = 300,
+               backoff: Optional[Backoff] = None, initial_delay: Optional[float] = None,
+               cancel_event: Optional[asyncio.Event] = None) -> Any:
+    """反复调用 check 直到返回最终结果。
+
+    check 返回 None 或 Pending(retry_after) 表示尚未完成，返回其他值即为结果，抛出异常则终止轮询。
+    超过 deadline 抛出 PollTimeout；cancel_event 被设置或协程被取消时抛出 CancelledError。
+
+    使用示例:
+        video_url = await poll(lambda: checkTask(task_id), name="doubao_video", deadline=600)
+    """
+    backoff = backoff or Backoff()
+    start = time.monotonic()
+    attempts = 0
+    delay = backoff.next() if initial_delay is None else initial_delay
+    outcome = "cancelled"
+    try:
+        while True:
+            remaining = deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                outcome = "timeout"
+                raise PollTimeout(name, time.monotonic() - start, attempts)
+            delay = min(delay, remaining)
+            if cancel_event is None:
+                await asyncio.sleep(delay)
+            else:
+                try:
+                    await asyncio.wait_for(cancel_event.wait(), timeout=delay)
+                    raise asyncio.CancelledError()
+                except asyncio.TimeoutError:
+                    pass
+            attempts += 1
+            try:
+                result = await check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            if result is None or isinstance(result, Pending):
+                delay = backoff.next(result.retry_after if result is not None else None)
+                continue
+            outcome = "done"
+            return result
+    finally:
+        record_poll(name, time.monotonic() - start, attempts, outcome)
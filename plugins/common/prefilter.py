@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from typing import Callable, FrozenSet, Iterable, Optional
+
+from nonebot.adapters.onebot.v11 import MessageEvent
+from nonebot.rule import Rule
+from nonebot.typing import T_State
+
+from .keyword_matcher import KeywordMatcher, keyword_matcher
+
+
+# 预筛选结果在 state 中的键
+PREFILTER_KEY = "prefilter"
+
+
+class MessageFeatures:
+    """一条消息的预计算特征：纯文本、发送者、群号，以及按需计算一次的关键词命中标签"""
+
+    def __init__(self, event: MessageEvent, prefilter: "MessagePrefilter"):
+        self.text = event.get_plaintext().strip()
+        self.user_id = str(event.user_id)
+        group_id = getattr(event, "group_id", None)
+        self.group_id = str(group_id) if group_id else None
+        self._prefilter = prefilter
+        self._tags: Optional[FrozenSet[str]] = None
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        """命中的关键词标签，首次访问时扫描一遍文本"""
+        if self._tags is None:
+            self._tags = self._prefilter.match(self.text)
+        return self._tags
+
+    def hit(self, tag: str) -> bool:
+        return tag in self.tags
+
+
+class MessagePrefilter:
+    """多个 on_message 监听器共享的消息预筛选：每个事件只提取一次纯文本，
+    所有插件的关键词登记到同一个 KeywordMatcher，扫描一遍即可得到全部命中的标签。
+
+    监听器通过 rule 中的廉价判断（集合查询、标签命中）决定是否唤醒，
+    计算结果写入 state[PREFILTER_KEY]，handler 中直接复用。
+
+    使用示例:
+        prefilter.register("bole.tencent", ["鹅", "腾讯"])
+        matcher = on_message(rule=prefilter_rule(lambda f: f.hit("bole.tencent")))
+    """
+
+    def __init__(self, matcher: KeywordMatcher = keyword_matcher, max_events: int = 64):
+        self.matcher = matcher
+        self.max_events = max_events
+        # 同一事件会依次经过多个监听器的 rule，按事件对象缓存特征
+        self._events: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def register(self, tag: str, keywords: Iterable[str]):
+        """登记（或替换）某个标签的默认关键词，可被关键词配置文件覆盖"""
+        self.matcher.register(tag, keywords)
+
+    def match(self, text: str) -> FrozenSet[str]:
+        return self.matcher.match(text)
+
+    def features(self, event: MessageEvent) -> MessageFeatures:
+        key = id(event)
+        cached = self._events.get(key)
+        if cached is not None and cached[0] is event:
+            return cached[1]
+        features = MessageFeatures(event, self)
+        self._events[key] = (event, features)
+        while len(self._events) > self.max_events:
+            self._events.popitem(last=False)
+        return features
+
+
+prefilter = MessagePrefilter()
+
+
+def prefilter_rule(check: Callable[[MessageFeatures], bool]) -> Rule:
+    """生成监听器的 rule：check 返回真时唤醒 handler，并把特征放进 state"""
+
+    async def _checker(event: MessageEvent, state: T_State) -> bool:
+        features = prefilter.features(event)
+        if not check(features):
+            return False
+        state[PREFILTER_KEY] = features
+        return True
+
+    return Rule(_checker)
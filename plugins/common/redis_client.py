@@ -1,6 +1,7 @@
 import os
 import redis
-from typing import Optional, Any
+import redis.asyncio as aioredis
+from typing import Optional, Any, Tuple
 
 
 class RedisClient:
@@ -68,15 +69,109 @@ class RedisClient:
             return False
 
 
+class AsyncRedisClient:
+    """RedisClient 的异步版本（redis.asyncio），不会阻塞事件循环。
+
+    使用示例:
+        client = AsyncRedisClient()
+        await client.set('k', 'v', ex=60)
+        await client.get('k')
+    """
+
+    def __init__(self, url: Optional[str] = None, decode_responses: bool = True, **kwargs):
+        self._url = url or os.environ.get("REDIS_URL")
+        self._client: Optional[aioredis.Redis] = None
+        if not self._url:
+            return
+        try:
+            # 连接在首次使用时才建立，同一实例的所有调用复用这个连接池
+            pool = aioredis.ConnectionPool.from_url(self._url, decode_responses=decode_responses, **kwargs)
+            self._client = aioredis.Redis(connection_pool=pool)
+        except Exception as e:
+            print(f"Async redis connection failed: {e}")
+            self._client = None
+
+    @property
+    def client(self) -> Optional[aioredis.Redis]:
+        return self._client
+
+    def is_available(self) -> bool:
+        return self._client is not None
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self._client:
+            return None
+        try:
+            return await self._client.get(key)
+        except Exception as e:
+            print(f"Redis get error: {e}")
+            return None
+
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[str], Optional[float]]:
+        """一次往返取回值与剩余过期时间（秒），键不存在或未设置过期时间时对应项为 None"""
+        if not self._client:
+            return None, None
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                value, pttl = await pipe.get(key).pttl(key).execute()
+        except Exception as e:
+            print(f"Redis get error: {e}")
+            return None, None
+        return value, pttl / 1000 if pttl is not None and pttl >= 0 else None
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        if not self._client:
+            return False
+        try:
+            return bool(await self._client.set(key, value, ex=ex))
+        except Exception as e:
+            print(f"Redis set error: {e}")
+            return False
+
+    async def delete(self, key: str) -> int:
+        if not self._client:
+            return 0
+        try:
+            return await self._client.delete(key)
+        except Exception as e:
+            print(f"Redis delete error: {e}")
+            return 0
+
+    async def exists(self, key: str) -> bool:
+        if not self._client:
+            return False
+        try:
+            return bool(await self._client.exists(key))
+        except Exception as e:
+            print(f"Redis exists error: {e}")
+            return False
+
+    async def close(self):
+        if not self._client:
+            return
+        try:
+            await self._client.connection_pool.disconnect()
+        except Exception as e:
+            print(f"Redis close error: {e}")
+
+
 # 创建模块级默认实例，保持向后兼容的使用方式
 redis_client = RedisClient()
 
+# 异步默认实例，进程内共享同一个连接池
+async_redis_client = AsyncRedisClient()
+
 
 def get_redis_client() -> Optional[redis.Redis]:
     """返回底层 redis.Redis 对象，可能为 None。"""
     return redis_client.client
 
 
+def get_async_redis_client() -> Optional[aioredis.Redis]:
+    """返回共享连接池上的 redis.asyncio.Redis 对象，可能为 None。"""
+    return async_redis_client.client
+
+
 def redis_get(key: str) -> Optional[str]:
     """兼容旧的模块级函数：从 Redis 获取键的值。"""
     return redis_client.get(key)
@@ -0,0 +1,131 @@
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from nonebot.log import logger
+
+
+# 优先级数值越小越先执行
+HIGH = 0
+NORMAL = 10
+LOW = 20
+
+# 各资源类别的 (并发上限, 排队上限)
+DEFAULT_LIMITS = {
+    "llm": (8, 32),
+    "image": (2, 6),
+    "video": (2, 4),
+    "render": (2, 6),
+}
+
+
+class SchedulerBusy(Exception):
+    """排队已满，调用方应立即回复繁忙"""
+
+    def __init__(self, resource: str):
+        super().__init__("嘟嘟bot正忙，当前排队人数过多，请稍后再试")
+        self.resource = resource
+
+
+class ResourcePool:
+    """单个资源类别的并发槽位 + 优先级等待队列"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters: List[list] = []  # [priority, seq, future]
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=200)
+        self.served = 0
+        self.rejected = 0
+
+    async def acquire(self, priority: int = NORMAL):
+        start = time.monotonic()
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusy(self.name)
+            future = asyncio.get_running_loop().create_future()
+            entry = [priority, next(self._seq), future]
+            heapq.heappush(self._waiters, entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 槽位已经转交给本调用方，归还给下一个等待者
+                    self.release()
+                elif entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+        wait = time.monotonic() - start
+        self._waits.append(wait)
+        self.served += 1
+        if wait > 1:
+            logger.debug(f"{self.name} 排队 {wait:.2f}s (priority={priority})")
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # 槽位直接转交，_active 不变
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "served": self.served,
+            "rejected": self.rejected,
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+        }
+
+
+class Scheduler:
+    """按资源类别（LLM、生图、生视频、CPU渲染）限制并发的调度器。
+
+    超过并发上限的请求按优先级排队，排队已满时抛出 SchedulerBusy，
+    由 common 插件的 run_postprocessor 统一回复繁忙提示。
+
+    使用示例:
+        async with scheduler.slot("image", priority=HIGH):
+            result = await callDoubaoImage(...)
+    """
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None):
+        self._pools: Dict[str, ResourcePool] = {}
+        for name, (concurrency, max_queue) in (limits or DEFAULT_LIMITS).items():
+            self.configure(name, concurrency, max_queue)
+
+    def configure(self, name: str, concurrency: int, max_queue: int):
+        self._pools[name] = ResourcePool(name, concurrency, max_queue)
+
+    def pool(self, name: str) -> ResourcePool:
+        return self._pools[name]
+
+    @asynccontextmanager
+    async def slot(self, resource: str, priority: int = NORMAL):
+        pool = self._pools[resource]
+        await pool.acquire(priority)
+        try:
+            yield
+        finally:
+            pool.release()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: pool.metrics() for name, pool in self._pools.items()}
+
+
+scheduler = Scheduler()
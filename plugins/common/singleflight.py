@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """合并并发的相同请求：同一key同时只有一个上游调用，其余调用方等待并共享结果。
+
+    上游调用在独立的task中执行，单个调用方被取消不会影响其他等待者。
+
+    使用示例:
+        flight = SingleFlight()
+        result = await flight.do(key, lambda: callUpstream(...))
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有调用方都被取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def inflight(self) -> int:
+        return len(self._inflight)
@@ -4,7 +4,9 @@ import hashlib
 import time
 import base64
 from typing import Tuple, Dict, Any
-import httpx
+
+from .http_client import get_httpx_client
+from .circuit_breaker import breaker_for
 
 
 class TencentTextModerator:
@@ -93,27 +95,28 @@ class TencentTextModerator:
         headers["Authorization"] = authorization
 
         try:
-            async with httpx.AsyncClient() as client:
+            client = get_httpx_client()
+            async with breaker_for(f"https://{self.endpoint}"):
                 response = await client.post(
                     f"https://{self.endpoint}",
                     headers=headers,
                     content=payload_str
                 )
                 response.raise_for_status()
-                result = response.json()
+            result = response.json()
 
-                if "Response" in result:
-                    resp = result["Response"]
-                    if "Error" in resp:
-                        return True, {"error": resp["Error"]}
+            if "Response" in result:
+                resp = result["Response"]
+                if "Error" in resp:
+                    return True, {"error": resp["Error"]}
 
-                    # 检查审查结果
-                    if resp.get("Suggestion") == "Block":
-                        return False, resp
-                    else:
-                        return True, resp.get("Data", {"Message": "内容通过审查"})
+                # 检查审查结果
+                if resp.get("Suggestion") == "Block":
+                    return False, resp
+                else:
+                    return True, resp.get("Data", {"Message": "内容通过审查"})
 
-                return True, {"error": "响应格式异常"}
+            return True, {"error": "响应格式异常"}
 
         except Exception as e:
             raise Exception(f"腾讯云API调用失败: {str(e)}")
\ No newline at end of file
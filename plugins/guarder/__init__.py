@@ -6,11 +6,15 @@ import nonebot
 from datetime import datetime
 from nonebot import on_message
 from nonebot.adapters.onebot.v11 import Bot, MessageEvent
+from nonebot.typing import T_State
 from nonebot.log import logger
-from typing import Set, Dict, Any
+from typing import Dict, List, Optional, Set, Tuple
 
-from plugins.common import TencentTextModerator, callSfVLM, callLLM
+from plugins.common import TencentTextModerator, TieredCache, callSfVLM, callLLM
+from plugins.common import MessageFeatures, PREFILTER_KEY, prefilter, prefilter_rule
 from .config import Config
+from .local_scorer import FLAG, PASS, LocalScorer, ModerationTriage
+from .batcher import MicroBatcher
 
 # 配置检查
 config = Config.parse_obj(nonebot.get_driver().config.dict())
@@ -35,8 +39,19 @@ moderator = TencentTextModerator(
     region=config.tencent_region
 )
 
-# 审查缓存，避免频繁重复审查
-moderation_cache: Dict[str, float] = {}
+# 同一用户触发审查后的静默时间（秒）
+MODERATION_COOLDOWN = 2700
+
+# 审查缓存，记录用户最近一次触发审查的时间，避免频繁重复审查。
+# 写入Redis并设置过期时间，bot重启或多实例部署时静默依然有效
+moderation_cache = TieredCache("guarder_moderation", maxsize=1024, ttl=MODERATION_COOLDOWN)
+
+# 本地打分分级：明显正常的消息不再调用大模型
+moderation_triage = ModerationTriage(
+    LocalScorer(config.guarder_scorer_path),
+    pass_threshold=config.guarder_pass_threshold,
+    flag_threshold=config.guarder_flag_threshold,
+)
 
 def should_moderate_group(group_id: str) -> bool:
     """
@@ -64,34 +79,34 @@ def should_moderate_group(group_id: str) -> bool:
     # 其他情况（不在黑白名单中，且黑名单不为空），不审查
     return False
 
+# 命中即直接回复的敏感词，登记到共享预筛选中与其他插件一起匹配
+BLACK_TEXTS = ['jb', '🦌', '龟头', '撸', '鸡巴']
+prefilter.register("guarder.black", BLACK_TEXTS)
+
+def need_moderation(features: MessageFeatures) -> bool:
+    """只监听特定QQ号，群聊消息还需检查黑白名单"""
+    if features.user_id not in MODERATION_QQ or not features.text:
+        return False
+    return features.group_id is None or should_moderate_group(features.group_id)
+
+def need_translation(features: MessageFeatures) -> bool:
+    return features.user_id in TRANSLATION_QQ and bool(features.text)
+
 # 审查守卫监听器，block=False
-moderation_guarder = on_message(priority=1000, block=False)
+moderation_guarder = on_message(rule=prefilter_rule(need_moderation), priority=1000, block=False)
 
 # 翻译守卫监听器，block=False
-translation_guarder = on_message(priority=1000, block=False)
+translation_guarder = on_message(rule=prefilter_rule(need_translation), priority=1000, block=False)
 
 @moderation_guarder.handle()
-async def handle_moderation(bot: Bot, event: MessageEvent):
+async def handle_moderation(bot: Bot, event: MessageEvent, state: T_State):
     """处理消息审查"""
+    features: MessageFeatures = state[PREFILTER_KEY]
     user_id = event.user_id
-    group_id = getattr(event, 'group_id', None)
-
-    # 只监听特定QQ号
-    if str(user_id) not in MODERATION_QQ:
-        return
-
-    # 检查群聊是否需要审查（如果是群聊消息）
-    if group_id and not should_moderate_group(group_id):
-        logger.debug(f"群聊 {group_id} 在白名单中或不在黑名单中，跳过审查")
-        return
-
-    message_text = event.get_plaintext().strip()
-    if not message_text:
-        return
+    message_text = features.text
 
     replySz = 50
-    blackTexts = ['jb', '🦌', '龟头', '撸', '鸡巴']
-    if any(blackText in message_text for blackText in blackTexts):
+    if features.hit("guarder.black"):
         replySz = 20
         response = await check_and_respond(replySz, True)
         await moderation_guarder.send(response, at_sender=True)
@@ -100,11 +115,15 @@ async def handle_moderation(bot: Bot, event: MessageEvent):
     # 检查缓存，45min内不再重复审查
     current_time = time.time()
     cache_key = f"{user_id}"
-    if cache_key in moderation_cache:
-        last_moderation_time = moderation_cache[cache_key]
-        if current_time - last_moderation_time < 2700:  # 0.75小时 = 1800秒
-            logger.debug(f"用户 {user_id} 在45min内已触发过审查，跳过本次审查")
-            return
+    last_moderation_time = await moderation_cache.get(cache_key)
+    if last_moderation_time is not None and current_time - last_moderation_time < MODERATION_COOLDOWN:
+        logger.debug(f"用户 {user_id} 在45min内已触发过审查，跳过本次审查")
+        return
+
+    verdict = moderation_triage.classify(message_text)
+    if verdict == PASS:
+        logger.debug(f"用户 {user_id} 的消息本地判定正常，跳过大模型审查")
+        return
 
     try:
         logger.info(f"开始对用户 {user_id} 的消息进行审查: {message_text[:50]}...")
@@ -113,18 +132,21 @@ async def handle_moderation(bot: Bot, event: MessageEvent):
         # is_pass, result = await moderator.check_text(message_text)
         # if not is_pass:
         #     logger.warning(f"用户 {user_id} 消息未通过审查: {result}")
-        #     moderation_cache[cache_key] = current_time
+        #     await moderation_cache.set(cache_key, current_time)
         #     response = await generate_moderation_response(replySz)
         #     await moderation_guarder.send(response, at_sender=True)
         # else:
         #     logger.info(f"用户 {user_id} 的消息通过审查")
 
-        # 使用大模型进行文本审查并生成回复
-        response = await check_and_respond(message_text)
+        # 使用大模型进行文本审查并生成回复，本地已判定不适合时只生成回复
+        if verdict == FLAG:
+            response = await check_and_respond(message_text, fast=True)
+        else:
+            response = await moderation_batcher.submit(message_text)
         if response:
             logger.warning(f"用户 {user_id} 消息被判定为不适合日常聊天展示")
-            # 记录审查缓存，半小时内不再审查
-            moderation_cache[cache_key] = current_time
+            # 记录审查缓存，45min内不再审查
+            await moderation_cache.set(cache_key, current_time)
             await moderation_guarder.send(response, at_sender=True)
         else:
             logger.info(f"用户 {user_id} 的消息通过审查")
@@ -133,17 +155,10 @@ async def handle_moderation(bot: Bot, event: MessageEvent):
         logger.error(f"消息审查处理出错: {e}")
 
 @translation_guarder.handle()
-async def handle_translation(bot: Bot, event: MessageEvent):
+async def handle_translation(bot: Bot, event: MessageEvent, state: T_State):
     """处理语言检测和翻译"""
     user_id = event.user_id
-
-    # 只监听特定QQ号
-    if str(user_id) not in TRANSLATION_QQ:
-        return
-
-    message_text = event.get_plaintext().strip()
-    if not message_text:
-        return
+    message_text = state[PREFILTER_KEY].text
 
     try:
         logger.info(f"开始对用户 {user_id} 的消息进行语言检测: {message_text[:50]}...")
@@ -210,7 +225,7 @@ async def detect_and_translate(text: str) -> str:
 请直接输出翻译结果，不要包含任何其他解释。"""
 
         logger.debug(f"调用LLM进行{language}翻译...")
-        response = await callLLM(prompt, model=TRANSLATION_MODEL)
+        response = await callLLM(prompt, model=TRANSLATION_MODEL, task="translation")
         logger.debug(f"LLM翻译响应: {response}")
 
         translation = response.strip()
@@ -226,8 +241,8 @@ async def detect_and_translate(text: str) -> str:
 
     return ""
 
-async def check_and_respond(text: str, fast: bool = False) -> str:
-    """使用大模型一次性完成文本审查和回复生成"""
+def pick_direction() -> Tuple[str, str]:
+    """返回当前时间戳字符串和按时间戳选择的创作方向"""
     # 获取完整时间戳
     now = datetime.now()
     # 格式：年月日时分秒毫秒，例如 20251103204556789
@@ -241,7 +256,11 @@ async def check_and_respond(text: str, fast: bool = False) -> str:
         "近现代中外经典哲学名句，如鲁迅等（示例：每一个不曾起舞的日子...，请选择其他类似名句）",
         "流行电影/二次元游戏台词（示例：「花车颠呀颠，纳西妲睁开眼」--原神，请选择其他类似台词）"
     ]
-    selected_direction = directions[direction]
+    return timestamp_str, directions[direction]
+
+async def check_and_respond(text: str, fast: bool = False) -> str:
+    """使用大模型一次性完成文本审查和回复生成"""
+    timestamp_str, selected_direction = pick_direction()
 
     prompt1 = f"""{text}
 ----
@@ -281,7 +300,7 @@ async def check_and_respond(text: str, fast: bool = False) -> str:
         prompt = prompt1 + prompt3 + prompt5
     try:
         # 使用callLLM函数调用LLM，启用JSON输出
-        response = await callLLM(prompt, model=MODERATION_MODEL, json_output=True)
+        response = await callLLM(prompt, model=MODERATION_MODEL, json_output=True, task="moderation")
         response = response.strip()
 
         # 解析JSON响应
@@ -300,6 +319,68 @@ async def check_and_respond(text: str, fast: bool = False) -> str:
         logger.error(f"LLM调用失败: {e}")
         return ""
 
+async def check_and_respond_batch(texts: List[str]) -> List[Optional[str]]:
+    """一次调用审查多条消息，返回与输入顺序一致的回复；某条结果缺失或格式错误时为 None"""
+    timestamp_str, selected_direction = pick_direction()
+    messages = json.dumps([{"id": i, "text": text} for i, text in enumerate(texts)], ensure_ascii=False)
+
+    prompt = f"""以下JSON数组中是{len(texts)}条聊天消息，每条有编号id和文本text：
+{messages}
+----
+任务：
+对每条消息分别判断是否符合下面不适合在聊天中展示的情况：
+1. 性暗示或色情低俗, 比如:今晚来一发
+2. 人身攻击
+3. 令人强烈不适的不良价值观
+
+如果某条消息非常不适合在聊天中展示，该条设置need_ban为true，并请[充分结合]当前时间：{timestamp_str} 和该条文本检索优美的句子，方向：{selected_direction}.
+注意：方向中的示例仅供参考，请根据当前时间和文本引用合适的句子，不要直接使用提到的示例。引用的句子应高于高中语文水平,与当前时间和文本相关,不要过于简单.
+
+请直接输出JSON，无需解释，严格按照以下格式返回，results中每条消息对应一项：
+{{
+  "results": [
+    {{
+      "id": 0,  // 消息编号
+      "need_ban": true/false,  // 是否很不适合日常聊天展示
+      "inappropriate_reasons": ["1", "3"],  // 不适合的情况（仅当need_ban为true时）
+      "poetry_content": "经典句子 —— 作者/出处\n(English translation)"  // 引用的美好句子内容（仅当need_ban为true时）
+    }}
+  ]
+}}
+"""
+    response = await callLLM(prompt, model=MODERATION_MODEL, json_output=True, task="moderation")
+    # 整体无法解析时抛出异常，由批处理器逐条重试
+    data = json.loads(response.strip())
+
+    results: List[Optional[str]] = [None] * len(texts)
+    for item in data.get("results", []) if isinstance(data, dict) else []:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), int) or not 0 <= item["id"] < len(texts):
+            continue
+        need_ban = item.get("need_ban")
+        if not isinstance(need_ban, bool):
+            continue
+        if need_ban:
+            poetry = item.get("poetry_content")
+            if not isinstance(poetry, str) or not poetry.strip():
+                continue
+            logger.info(f"文本不适合展示，原因: {item.get('inappropriate_reasons', [])}, 类别: {selected_direction}")
+            results[item["id"]] = "\n" + poetry
+        else:
+            results[item["id"]] = ""
+    return results
+
+# 多名监听用户短时间内连续发言时，合并为一次大模型调用
+moderation_batcher = MicroBatcher(
+    check_and_respond_batch,
+    check_and_respond,
+    window=config.guarder_batch_window,
+    max_size=config.guarder_batch_size,
+)
+
+def get_moderation_metrics() -> Dict[str, float]:
+    """获取本地分级与批量审查的统计，包括省下的大模型调用次数"""
+    return {**moderation_triage.metrics(), **moderation_batcher.metrics()}
+
 def get_moderation_qq() -> Set[str]:
     """获取审查守卫监听QQ号列表"""
     return MODERATION_QQ.copy()
@@ -0,0 +1,95 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+from nonebot.log import logger
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """把短时间内提交的多个请求合并成一次批量调用，再把结果分发回各自的调用方。
+
+    第一个请求到达后等待 window 秒，或攒满 max_size 个时立即发出。
+    batch_fn 返回与输入等长的结果列表，某一项为 None 表示该项解析失败，
+    这些项以及整批调用失败时的所有项都会退回 single_fn 逐个处理；只有一个请求时直接走 single_fn。
+
+    使用示例:
+        batcher = MicroBatcher(check_batch, check_one, window=0.3, max_size=8)
+        result = await batcher.submit(text)
+    """
+
+    def __init__(self, batch_fn: Callable[[List[T]], Awaitable[List[Optional[R]]]],
+                 single_fn: Callable[[T], Awaitable[R]], window: float = 0.3, max_size: int = 8):
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.window = window
+        self.max_size = max_size
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # 持有后台任务的引用，避免被垃圾回收
+        self._tasks: Set[asyncio.Task] = set()
+        self.counts = {"items": 0, "batches": 0, "batched_items": 0, "singles": 0, "fallbacks": 0}
+
+    async def submit(self, item: T) -> R:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self.counts["items"] += 1
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        results: List[Optional[R]] = [None] * len(items)
+        if len(items) > 1:
+            self.counts["batches"] += 1
+            self.counts["batched_items"] += len(items)
+            try:
+                results = list(await self.batch_fn(items))
+                if len(results) != len(items):
+                    raise ValueError(f"批量结果数量 {len(results)} 与请求数量 {len(items)} 不一致")
+            except Exception as e:
+                logger.warning(f"批量调用失败，逐条处理 {len(items)} 个请求: {e}")
+                results = [None] * len(items)
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(items) > 1:
+            self.counts["fallbacks"] += len(missing)
+        self.counts["singles"] += len(missing)
+        singles = await asyncio.gather(*(self.single_fn(items[i]) for i in missing), return_exceptions=True)
+
+        outcomes: List[object] = list(results)
+        for i, result in zip(missing, singles):
+            outcomes[i] = result
+        for (_, future), outcome in zip(batch, outcomes):
+            # 调用方可能已被取消
+            if future.done():
+                continue
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def metrics(self) -> Dict[str, float]:
+        """合并后的请求统计：llm_calls 为实际发出的调用次数"""
+        llm_calls = self.counts["batches"] + self.counts["singles"]
+        return {
+            **{f"batch_{key}": value for key, value in self.counts.items()},
+            "batch_llm_calls": llm_calls,
+            "batch_calls_saved": max(0, self.counts["items"] - llm_calls),
+        }
@@ -21,4 +21,15 @@ class Config(BaseModel):
     group_blacklist: List[str] = []  # 空列表表示默认所有群都是黑名单
 
     # LLM配置
-    llm_model: str = "z-ai/glm-4.5-air:free"
\ No newline at end of file
+    llm_model: str = "z-ai/glm-4.5-air:free"
+
+    # 本地审查模型（local_scorer.py 训练得到），模型文件不存在时所有消息都交给大模型
+    guarder_scorer_path: str = "data/guarder_scorer.json"
+    # 本地打分低于该值的消息直接放行，不调用大模型
+    guarder_pass_threshold: float = 0.2
+    # 本地打分不低于该值的消息跳过大模型判定，只生成回复
+    guarder_flag_threshold: float = 0.97
+
+    # 批量审查：首条消息到达后最多等待的秒数，以及单批最多的消息数
+    guarder_batch_window: float = 0.3
+    guarder_batch_size: int = 8
\ No newline at end of file
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from nonebot.log import logger
+
+# 本文件不导入插件包，可以脱离bot单独运行训练：
+#   python plugins/guarder/local_scorer.py samples.tsv data/guarder_scorer.json
+# samples.tsv 每行为 "标签<TAB>文本"，标签 1 表示不适合展示，0 表示正常
+
+# 字符n-gram的长度范围与哈希桶数
+NGRAM_RANGE = (1, 2, 3)
+BUCKETS = 1 << 18
+# 只取消息前若干字符，长消息的打分耗时保持稳定
+MAX_CHARS = 500
+
+# 打分结果
+PASS = "pass"          # 本地判定正常，不调用大模型
+ESCALATE = "escalate"  # 交给大模型审查
+FLAG = "flag"          # 本地判定不适合展示，只让大模型生成回复
+
+
+def extract_features(text: str, buckets: int = BUCKETS) -> Dict[int, float]:
+    """NFKC归一、忽略大小写后取字符n-gram，哈希到固定维度，按L2归一化"""
+    text = unicodedata.normalize("NFKC", text[:MAX_CHARS]).casefold()
+    padded = f"\x02{text}\x03"
+    indices = set()
+    for n in NGRAM_RANGE:
+        for i in range(len(padded) - n + 1):
+            # crc32 在不同进程间稳定，内置 hash 会随机化
+            indices.add(zlib.crc32(f"{n}:{padded[i:i + n]}".encode("utf-8")) % buckets)
+    if not indices:
+        return {}
+    value = 1 / math.sqrt(len(indices))
+    return {index: value for index in indices}
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1 / (1 + math.exp(-z))
+
+
+class LocalScorer:
+    """字符n-gram逻辑回归打分器，返回消息不适合展示的概率。
+
+    模型文件为 JSON：{"buckets": 262144, "bias": -1.2, "weights": {"123": 0.5, ...}}。
+    模型文件不存在时 score 返回 None，所有消息都交给大模型；文件更新后自动重新加载。
+    """
+
+    def __init__(self, path: str, reload_interval: float = 30):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.buckets = BUCKETS
+        self.bias = 0.0
+        self.weights: Optional[Dict[int, float]] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            self.weights = None
+            self._mtime = None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                model = json.load(f)
+            self.buckets = int(model["buckets"])
+            self.bias = float(model["bias"])
+            self.weights = {int(index): float(weight) for index, weight in model["weights"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"本地审查模型 {self.path} 加载失败: {e}")
+            return
+        self._mtime = mtime
+
+    @property
+    def available(self) -> bool:
+        self._maybe_reload()
+        return self.weights is not None
+
+    def score(self, text: str) -> Optional[float]:
+        if not self.available:
+            return None
+        weights = self.weights
+        z = self.bias
+        for index, value in extract_features(text, self.buckets).items():
+            z += weights.get(index, 0.0) * value
+        return _sigmoid(z)
+
+
+class ModerationTriage:
+    """审查分级：本地打分低于 pass_threshold 的消息直接放行，高于 flag_threshold 的直接判定，
+    其余交给大模型。同时统计省下的大模型调用次数。
+
+    使用示例:
+        verdict = triage.classify(text)
+        if verdict == PASS:
+            return
+    """
+
+    def __init__(self, scorer: LocalScorer, pass_threshold: float, flag_threshold: float):
+        self.scorer = scorer
+        self.pass_threshold = pass_threshold
+        self.flag_threshold = flag_threshold
+        self.counts = {PASS: 0, ESCALATE: 0, FLAG: 0}
+        self.no_model = 0
+        self.elapsed = 0.0
+
+    def classify(self, text: str) -> str:
+        start = time.perf_counter()
+        score = self.scorer.score(text)
+        self.elapsed += time.perf_counter() - start
+        if score is None:
+            self.no_model += 1
+            verdict = ESCALATE
+        elif score < self.pass_threshold:
+            verdict = PASS
+        elif score >= self.flag_threshold:
+            verdict = FLAG
+        else:
+            verdict = ESCALATE
+        self.counts[verdict] += 1
+        return verdict
+
+    def metrics(self) -> Dict[str, float]:
+        total = sum(self.counts.values())
+        return {
+            "total": total,
+            "passed_locally": self.counts[PASS],
+            "flagged_locally": self.counts[FLAG],
+            "escalated": self.counts[ESCALATE],
+            "no_model": self.no_model,
+            # 本地放行的消息完全不调用大模型
+            "llm_calls_avoided": self.counts[PASS],
+            "avoided_ratio": self.counts[PASS] / total if total else 0.0,
+            "avg_score_ms": self.elapsed / total * 1000 if total else 0.0,
+        }
+
+
+def load_samples(path: str) -> List[Tuple[int, str]]:
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            label, _, text = line.rstrip("\n").partition("\t")
+            if label in ("0", "1") and text:
+                samples.append((int(label), text))
+    return samples
+
+
+def train(samples: Iterable[Tuple[int, str]], epochs: int = 10, lr: float = 0.5, l2: float = 1e-5,
+          buckets: int = BUCKETS, seed: int = 0) -> dict:
+    """随机梯度下降训练逻辑回归，正负样本按数量反比加权"""
+    data = [(label, extract_features(text, buckets)) for label, text in samples]
+    positives = sum(label for label, _ in data)
+    negatives = len(data) - positives
+    if not positives or not negatives:
+        raise ValueError("训练集需要同时包含正负样本")
+    class_weight = {1: len(data) / (2 * positives), 0: len(data) / (2 * negatives)}
+
+    rng = random.Random(seed)
+    weights: Dict[int, float] = {}
+    bias = 0.0
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        step = lr / (1 + epoch)
+        loss = 0.0
+        for label, features in data:
+            z = bias + sum(weights.get(index, 0.0) * value for index, value in features.items())
+            p = _sigmoid(z)
+            loss -= class_weight[label] * math.log(max(p if label else 1 - p, 1e-12))
+            grad = class_weight[label] * (p - label)
+            for index, value in features.items():
+                weight = weights.get(index, 0.0)
+                weights[index] = weight - step * (grad * value + l2 * weight)
+            bias -= step * grad
+        print(f"epoch {epoch + 1}: loss {loss / len(data):.4f}")
+    return {
+        "buckets": buckets,
+        "bias": round(bias, 6),
+        "weights": {str(index): round(weight, 6) for index, weight in weights.items() if abs(weight) > 1e-6},
+    }
+
+
+def evaluate(model: dict, samples: Iterable[Tuple[int, str]], thresholds: Iterable[float] = (0.1, 0.2, 0.3, 0.5)):
+    """打印不同放行阈值下放行的比例与误放的不适合消息数，用于选择 pass 阈值"""
+    weights = {int(index): weight for index, weight in model["weights"].items()}
+    scored = []
+    for label, text in samples:
+        z = model["bias"] + sum(weights.get(index, 0.0) * value
+                                for index, value in extract_features(text, model["buckets"]).items())
+        scored.append((label, _sigmoid(z)))
+    for threshold in thresholds:
+        passed = [label for label, score in scored if score < threshold]
+        print(f"pass<{threshold}: 放行 {len(passed)}/{len(scored)}，其中误放 {sum(passed)} 条")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("用法: python local_scorer.py samples.tsv output.json [eval.tsv]")
+        sys.exit(1)
+    train_samples = load_samples(sys.argv[1])
+    trained = train(train_samples)
+    with open(sys.argv[2], "w", encoding="utf-8") as f:
+        json.dump(trained, f)
+    print(f"已保存模型: {sys.argv[2]}，非零权重 {len(trained['weights'])} 个")
+    evaluate(trained, load_samples(sys.argv[3]) if len(sys.argv) > 3 else train_samples)
@@ -4,7 +4,9 @@ from nonebot.plugin import on_command
 from nonebot.adapters.onebot.v11 import Bot, Event, MessageSegment, Message
 
 from .config import Config
+from plugins.common import scheduler, SchedulerBusy
 
+import asyncio
 import subprocess
 import json
 import shlex
@@ -21,6 +23,11 @@ __plugin_meta__ = PluginMetadata(
 
 config = get_plugin_config(Config)
 
+async def runRender(command, **kwargs) -> subprocess.CompletedProcess:
+    """占用一个 render 槽位，在线程中执行渲染命令，避免阻塞事件循环"""
+    async with scheduler.slot("render"):
+        return await asyncio.to_thread(subprocess.run, command, capture_output=True, text=True, **kwargs)
+
 lilypond = on_command('lilypond', aliases={'ly'}, priority=10)
 
 @lilypond.handle()
@@ -37,8 +44,8 @@ async def _(bot: Bot, event: Event):
         generate_ts_path = os.path.join(script_dir, 'generate.ts')
         
         command = ["bun", generate_ts_path, message]
+        result = await runRender(command, cwd=temp_dir)
         try:
-            result = subprocess.run(command, capture_output=True, text=True, cwd=temp_dir)
             output = result.stdout
             print(output)
             data = json.loads(output)
@@ -66,8 +73,8 @@ async def _(bot: Bot, event: Event, msg: Message = CommandArg()):
         generate_ts_path = os.path.join(script_dir, 'generate-raw.ts')
         print(output_path)
         command = ["bun", generate_ts_path, output_path]
+        result = await runRender(command, cwd=temp_dir)
         try:
-            result = subprocess.run(command, capture_output=True, text=True, cwd=temp_dir)
             output = result.stdout
             print(output)
             data = json.loads(output)
@@ -225,7 +232,9 @@ async def _(bot: Bot, event: Event, msg: Message = CommandArg()):
                     str(input_path),
                     "-o", str(output_path)  # 正确分隔参数
                 ]
-                subprocess.run(cmd, check=True, capture_output=True, text=True)
+                await runRender(cmd, check=True)
+        except SchedulerBusy:
+            raise
         except Exception as e:
             print(f"发生错误：{str(e)}")
             return
@@ -237,8 +246,8 @@ async def _(bot: Bot, event: Event, msg: Message = CommandArg()):
         print(output_path)
         
         command = ["bun", generate_ts_path, output_path]
+        result = await runRender(command, cwd=temp_dir)
         try:
-            result = subprocess.run(command, capture_output=True, text=True, cwd=temp_dir)
             output = result.stdout
             print(output)
             data = json.loads(output)
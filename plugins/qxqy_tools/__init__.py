@@ -14,6 +14,8 @@ import aiohttp
 import json
 import random
 
+from plugins.common import get_aiohttp_session, breaker_for
+
 from .config import Config
 
 __plugin_meta__ = PluginMetadata(
@@ -66,52 +68,56 @@ async def handle_qxqy(bot: Bot, event: MessageEvent, msg: Message = CommandArg()
         }
 
         # 发送API请求
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                config.qxqy_api_url,
-                json=request_data,
-                headers={"Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=300)
-            ) as response:
-                if response.status != 200:
-                    await qxqy_command.finish(f"API请求失败，状态码：{response.status}", at_sender=True)
-
-                result = await response.json()
-
-                if not result.get("success", False):
-                    await qxqy_command.finish("API返回失败：" + result.get("message", "未知错误"), at_sender=True)
-
-                data = result.get("data", {})
-                answer = data.get("answer", "未找到答案")
-                sources = data.get("sources", [])
-
-                # 构造转发消息内容
-                forward_messages = []
-
-                # 第一条：答案
-                forward_messages.append(answer)
-
-                # 第二条：来源链接（如果有）
-                if sources:
-                    source_links = []
-                    for source in sources:
-                        title = source.get("title", "未知来源")
-                        url = source.get("url", "")
-                        if url:
-                            source_links.append(f"• {title}\n  {url}")
-
-                    if source_links:
-                        source_text = "📚 参考来源：\n" + "\n".join(source_links)
-                        forward_messages.append(source_text)
-
-                # 发送转发消息
-                if len(forward_messages) == 1 and len(forward_messages[0]) < 200:
-                    # 如果答案较短且没有来源，直接发送
-                    await qxqy_command.finish(forward_messages[0], at_sender=True)
-                else:
-                    # 使用转发消息格式
-                    msgs = wrapMessageForward(f"千星奇域回答 to {event.user_id}", forward_messages)
-                    await bot.call_api("send_group_forward_msg", group_id=event.group_id, messages=msgs)
+        session = get_aiohttp_session()
+        async with breaker_for(config.qxqy_api_url), session.post(
+            config.qxqy_api_url,
+            json=request_data,
+            headers={"Content-Type": "application/json"},
+            timeout=aiohttp.ClientTimeout(total=300)
+        ) as response:
+            status = response.status
+            if status >= 500:
+                # 服务端错误计入熔断统计
+                response.raise_for_status()
+            result = await response.json() if status == 200 else None
+
+        if status != 200:
+            await qxqy_command.finish(f"API请求失败，状态码：{status}", at_sender=True)
+
+        if not result.get("success", False):
+            await qxqy_command.finish("API返回失败：" + result.get("message", "未知错误"), at_sender=True)
+
+        data = result.get("data", {})
+        answer = data.get("answer", "未找到答案")
+        sources = data.get("sources", [])
+
+        # 构造转发消息内容
+        forward_messages = []
+
+        # 第一条：答案
+        forward_messages.append(answer)
+
+        # 第二条：来源链接（如果有）
+        if sources:
+            source_links = []
+            for source in sources:
+                title = source.get("title", "未知来源")
+                url = source.get("url", "")
+                if url:
+                    source_links.append(f"• {title}\n  {url}")
+
+            if source_links:
+                source_text = "📚 参考来源：\n" + "\n".join(source_links)
+                forward_messages.append(source_text)
+
+        # 发送转发消息
+        if len(forward_messages) == 1 and len(forward_messages[0]) < 200:
+            # 如果答案较短且没有来源，直接发送
+            await qxqy_command.finish(forward_messages[0], at_sender=True)
+        else:
+            # 使用转发消息格式
+            msgs = wrapMessageForward(f"千星奇域回答 to {event.user_id}", forward_messages)
+            await bot.call_api("send_group_forward_msg", group_id=event.group_id, messages=msgs)
 
     except aiohttp.ClientError as e:
         await qxqy_command.finish(f"网络请求失败：{str(e)}", at_sender=True)
@@ -13,7 +13,10 @@ from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
 from tencentcloud.tts.v20190823 import tts_client, models
 import base64
-import tempfile
+import asyncio
+from functools import lru_cache
+from plugins.common import run_blocking, run_blocking_in, SingleFlight
+from .tts_cache import AudioCache, splitSentences, concatMp3
 
 __plugin_meta__ = PluginMetadata(
     name="语音合成",
@@ -26,6 +29,63 @@ __plugin_meta__ = PluginMetadata(
 
 summary_audio = on_command("语音合成", priority=13, block=True)
 
+@lru_cache(maxsize=4)
+def getTtsClient(secret_id: str, secret_key: str) -> tts_client.TtsClient:
+    """按密钥缓存TTS客户端，避免每次请求重新构造凭证与连接配置"""
+    cred = credential.Credential(secret_id, secret_key)
+    httpProfile = HttpProfile()
+    httpProfile.endpoint = "tts.tencentcloudapi.com"
+
+    clientProfile = ClientProfile()
+    clientProfile.httpProfile = httpProfile
+    return tts_client.TtsClient(cred, "", clientProfile)
+
+VOICE_TYPE = 101016 # 智瑜
+SPEED = 0
+# 同一段文本分片并发合成的上限
+TTS_CONCURRENCY = 3
+
+audio_cache = AudioCache()
+tts_flight = SingleFlight()
+
+async def synthesizeChunk(client: tts_client.TtsClient, text: str, session_id: str, voice: int, speed: float) -> bytes:
+    req = models.TextToVoiceRequest()
+    params = {
+        "Text": text,
+        "SessionId": session_id,
+        "Volume": 5,
+        "Speed": speed,
+        "ProjectId": 0,
+        "ModelType": 1,
+        "VoiceType": voice,
+        "PrimaryLanguage": 1,
+        "SampleRate": 24000,
+        "Codec": "mp3"
+    }
+    req.from_json_string(json.dumps(params))
+
+    # SDK为同步调用（2-5秒），放到语音合成专用线程池中执行，所有请求的分片共享该池的并发上限
+    resp = await run_blocking_in("tts", client.TextToVoice, req)
+    return base64.b64decode(resp.Audio)
+
+async def synthesize(client: tts_client.TtsClient, text: str, session_id: str,
+                     voice: int = VOICE_TYPE, speed: float = SPEED) -> str:
+    """合成整段文本并返回缓存中的mp3路径：长文本按句切分后并发合成，再直接拼接MP3帧"""
+    cached = audio_cache.get(text, voice, speed)
+    if cached is not None:
+        return str(cached.resolve())
+
+    semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+
+    async def synthesizeLimited(index: int, chunk: str) -> bytes:
+        async with semaphore:
+            return await synthesizeChunk(client, chunk, f"{session_id}_{index}", voice, speed)
+
+    chunks = splitSentences(text)
+    parts = await asyncio.gather(*(synthesizeLimited(i, chunk) for i, chunk in enumerate(chunks)))
+    path = await run_blocking(audio_cache.put, text, voice, speed, concatMp3(parts))
+    return str(path.resolve())
+
 @summary_audio.handle()
 async def handle_summary_audio(event: GroupMessageEvent, msg: Message = nonebot.params.CommandArg()):
     text_to_synthesize = msg.extract_plain_text().strip()
@@ -43,51 +103,17 @@ async def handle_summary_audio(event: GroupMessageEvent, msg: Message = nonebot.
         await summary_audio.finish("缺少腾讯云密钥，请设置 HUNYUAN_SECRET_ID 和 HUNYUAN_SECRET_KEY 环境变量。")
 
     try:
-        cred = credential.Credential(TENCENTCLOUD_SECRET_ID, TENCENTCLOUD_SECRET_KEY)
-        httpProfile = HttpProfile()
-        httpProfile.endpoint = "tts.tencentcloudapi.com"
-
-        clientProfile = ClientProfile()
-        clientProfile.httpProfile = httpProfile
-        client = tts_client.TtsClient(cred, "", clientProfile)
-
-        req = models.TextToVoiceRequest()
+        client = getTtsClient(TENCENTCLOUD_SECRET_ID, TENCENTCLOUD_SECRET_KEY)
         session_id = f"{event.user_id}_{int(time.time())}"
-        params = {
-            "Text": text_to_synthesize,
-            "SessionId": session_id,
-            "Volume": 5,
-            "Speed": 0,
-            "ProjectId": 0,
-            "ModelType": 1,
-            "VoiceType": 101016, # 智瑜
-            "PrimaryLanguage": 1,
-            "SampleRate": 24000,
-            "Codec": "mp3"
-        }
-        req.from_json_string(json.dumps(params))
-
-        resp = client.TextToVoice(req)
-
-        audio_data = base64.b64decode(resp.Audio)
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio_file:
-            temp_audio_file.write(audio_data)
-            temp_audio_path = temp_audio_file.name
-
-        # 构建语音消息段
-        audio_segment = MessageSegment.record(f"file:///{temp_audio_path}")
-
-        # 发送语音消息
-        await summary_audio.finish(audio_segment)
-
-        # 删除临时文件
-        os.remove(temp_audio_path)
-
-
+        # 多人同时合成同一段文本时只调用一次接口
+        audio_path = await tts_flight.do((text_to_synthesize, VOICE_TYPE, SPEED),
+                                         lambda: synthesize(client, text_to_synthesize, session_id))
     except TencentCloudSDKException as err:
         nonebot.logger.error(f"腾讯云语音合成API调用失败: {err}")
         await summary_audio.finish(f"语音合成失败，请检查后台日志。")
     except Exception as e:
         nonebot.logger.error(f"处理语音合成时发生未知错误: {e}")
         await summary_audio.finish(f"发生未知错误，请联系管理员。")
+
+    # 语音文件保存在缓存目录中，由缓存统一淘汰，无需在发送后删除
+    await summary_audio.finish(MessageSegment.record(f"file:///{audio_path}"))
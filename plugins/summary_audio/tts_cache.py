@@ -0,0 +1,109 @@
+import os
+import re
+import time
+import hashlib
+from pathlib import Path
+from typing import List, Optional
+
+
+# 腾讯云 TextToVoice 单次请求的文本长度上限内，按句子边界切分的目标长度
+CHUNK_CHARS = 150
+SENTENCE_END = re.compile(r"(?<=[。！？!?；;…\n])")
+
+
+def splitSentences(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """按句子边界把长文本切成不超过max_chars的片段，单句过长时硬切"""
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if len(current) + len(sentence) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def stripId3(data: bytes) -> bytes:
+    """去掉MP3头部的ID3v2标签和尾部的ID3v1标签，只保留音频帧"""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # 标签大小为4个7位的syncsafe整数，不含10字节头（有footer时再加10字节）
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        size += 20 if data[5] & 0x10 else 10
+        data = data[size:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+def concatMp3(parts: List[bytes]) -> bytes:
+    """直接拼接同参数MP3的帧，不重新编码"""
+    if len(parts) == 1:
+        return parts[0]
+    return b"".join(stripId3(part) for part in parts)
+
+
+class AudioCache:
+    """合成结果的磁盘缓存，按 (文本哈希, 音色, 语速) 命名，超过容量时淘汰最久未使用的文件。
+
+    文件本身就是发送给协议端的语音文件，不再需要临时文件；写入先落到 .tmp 再原子替换。
+    """
+
+    def __init__(self, directory: str = "data/tts_cache", max_bytes: int = 200 * 1024 * 1024,
+                 max_files: int = 2000):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+    def path(self, text: str, voice: int, speed: float) -> Path:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest[:32]}_{voice}_{speed}.mp3"
+
+    def get(self, text: str, voice: int, speed: float) -> Optional[Path]:
+        path = self.path(text, voice, speed)
+        try:
+            # 更新mtime作为最近使用时间
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, text: str, voice: int, speed: float, data: bytes) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(text, voice, speed)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{time.monotonic_ns()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[Path] = None):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".mp3") and entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        count = len(files)
+        for _, size, file_path in files:
+            if total <= self.max_bytes and count <= self.max_files:
+                break
+            if keep is not None and file_path == str(keep):
+                continue
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            count -= 1
@@ -13,7 +13,6 @@ __plugin_meta__ = PluginMetadata(
 config = get_plugin_config(Config)
 
 import os
-from openai import AsyncOpenAI
 from nonebot import on_command, on_message, Bot
 from nonebot.rule import Rule
 from nonebot.adapters.onebot.v11 import MessageEvent, Message, MessageSegment
@@ -24,24 +23,24 @@ from typing import Optional
 import httpx
 import base64
 import asyncio
-from plugins.common import autoWrapMessage
+from plugins.common import autoWrapMessage, get_image_data_url, get_openai_client, prepare_image
 
 # 腾讯混元API配置
 HUNYUAN_API_KEY = os.environ.get("HUNYUAN_API_KEY", "sk-")
 API_BASE_URL = "https://api.hunyuan.cloud.tencent.com/v1"
 
+VISION_MODEL = "hunyuan-turbos-vision-20250619"
+
 # 默认提示语
 DEFAULT_PROMPT = "简洁地输出该图片的内容"
 
-# 创建异步OpenAI客户端
-client = AsyncOpenAI(
-    api_key=HUNYUAN_API_KEY,
-    base_url=API_BASE_URL,
-)
+# 创建异步OpenAI客户端（共享连接池）
+client = get_openai_client(API_BASE_URL, HUNYUAN_API_KEY)
 
 async def analyze_image(image_url: str, prompt: str) -> str:
     """使用腾讯混元API分析图片"""
     try:
+        image_url = await prepare_image(image_url, VISION_MODEL)
         # 构造消息内容
         messages = [
             {
@@ -58,7 +57,7 @@ async def analyze_image(image_url: str, prompt: str) -> str:
 
         # 调用API
         response = await client.chat.completions.create(
-            model="hunyuan-turbos-vision-20250619",
+            model=VISION_MODEL,
             #model="hunyuan-t1-vision-20250619",
             messages=messages,
             max_tokens=1024,
@@ -70,21 +69,6 @@ async def analyze_image(image_url: str, prompt: str) -> str:
     except Exception as e:
         return f"图片分析失败: {str(e)}"
 
-async def get_image_data_url(img_url: str) -> str:
-    """将图片URL转换为base64格式的data URL"""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(img_url)
-        response.raise_for_status()
-        img_data = response.content
-
-        # 获取图片类型（默认为jpeg）
-        content_type = response.headers.get('Content-Type', 'image/jpeg')
-        img_type = content_type.split('/')[-1]
-
-        # 创建data URL
-        img_base64 = base64.b64encode(img_data).decode('utf-8')
-        return f"data:image/{img_type};base64,{img_base64}"
-
 async def process_image(event: MessageEvent, prompt: str) -> Optional[str]:
     """处理并分析图片"""
     # 查找图片URL
@@ -246,20 +230,27 @@ from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
 from tencentcloud.hunyuan.v20230901 import hunyuan_client, models
 import httpx
+from functools import lru_cache
 from nonebot.adapters.onebot.v11 import MessageSegment
+from plugins.common import run_blocking
+
+@lru_cache(maxsize=4)
+def getHunyuanClient(secret_id: str, secret_key: str) -> hunyuan_client.HunyuanClient:
+    """按密钥缓存混元客户端，避免每次请求重新构造凭证与连接配置"""
+    cred = credential.Credential(secret_id, secret_key)
+    httpProfile = HttpProfile()
+    httpProfile.endpoint = "hunyuan.tencentcloudapi.com"
+    clientProfile = ClientProfile()
+    clientProfile.httpProfile = httpProfile
+    return hunyuan_client.HunyuanClient(cred, "ap-guangzhou", clientProfile)
 
 async def text_to_image_lite(prompt: str) -> MessageSegment:
     """调用腾讯云轻量版文生图API"""
     try:
-        cred = credential.Credential(
+        client = getHunyuanClient(
             os.getenv("TENCENTCLOUD_SECRET_ID", SECRET_ID),
             os.getenv("TENCENTCLOUD_SECRET_KEY", SECRET_KEY)
         )
-        httpProfile = HttpProfile()
-        httpProfile.endpoint = "hunyuan.tencentcloudapi.com"
-        clientProfile = ClientProfile()
-        clientProfile.httpProfile = httpProfile
-        client = hunyuan_client.HunyuanClient(cred, "ap-guangzhou", clientProfile)
 
         req = models.TextToImageLiteRequest()
         params = {
@@ -267,7 +258,8 @@ async def text_to_image_lite(prompt: str) -> MessageSegment:
             "RspImgType": "url"
         }
         req.from_json_string(json.dumps(params))
-        resp = client.TextToImageLite(req)
+        # SDK为同步调用，放到线程池中执行
+        resp = await run_blocking(client.TextToImageLite, req)
         img_url = resp.ResultImage
         return MessageSegment.image(img_url)
     except TencentCloudSDKException as err:
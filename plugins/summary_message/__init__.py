@@ -1,6 +1,8 @@
 import traceback
+import asyncio
+import time
 import re
-import httpx
+import hashlib
 
 import nonebot
 from nonebot.adapters import Bot, Event
@@ -9,7 +11,9 @@ from nonebot.log import logger
 from nonebot.matcher import Matcher
 from nonebot.plugin import PluginMetadata
 from nonebot import on_command
-from plugins.common import autoWrapMessage, extract_text
+from plugins.common import autoWrapMessage, autoWrapMessageStream, extract_text, get_httpx_client, get_openai_client, TieredCache, SingleFlight, Endpoint, llm_router, breaker_for
+from plugins.common import scheduler, NORMAL, LOW
+from openai.types.chat import ChatCompletionMessage
 from nonebot_plugin_alconna import Alconna, Args, on_alconna
 
 from .config import Config
@@ -24,45 +28,154 @@ __plugin_meta__ = PluginMetadata(
 
 )
 
-from openai import AsyncOpenAI
-
 plugin_config = Config.parse_obj(nonebot.get_driver().config.dict())
 
-client = AsyncOpenAI(
-    api_key=plugin_config.chat_oneapi_key, base_url=plugin_config.chat_oneapi_url
-)
+LLM_TASK = "summary"
 
 DEEPSEEK_MODEL = plugin_config.default_online_model
 OFFLINE_MODEL = plugin_config.default_offline_model
 
+# 同一条引用消息常被多人重复调用同一命令，按prompt内容缓存模型回复
+llm_cache = TieredCache("llm_cache", maxsize=plugin_config.llm_cache_size, ttl=plugin_config.llm_cache_ttl)
+llm_flight = SingleFlight()
+
 conclude = on_command("概括", priority=13, block=True)
 
+def _cacheKey(kind: str, model: str, content: str, temperature: float, top_p: float) -> str:
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"{kind}:{model}:{temperature}:{top_p}:{digest}"
+
+async def _cachedCompletion(kind: str, model: str, content: str, temperature: float, top_p: float, extra_body: dict):
+    """相同 (模型, prompt, temperature, top_p) 的请求直接返回缓存结果，不消耗token"""
+    key = _cacheKey(kind, model, content, temperature, top_p)
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        logger.debug(f"LLM缓存命中: {key[:48]}...")
+        return ChatCompletionMessage(role="assistant", content=cached)
+
+    # 多人同时对同一条消息调用同一命令时，只发出一次上游请求
+    return await llm_flight.do(key, lambda: _fetchCompletion(key, model, content, temperature, top_p, extra_body))
+
+# 超长prompt（网页、长聊天记录）耗时久，排队时让位给普通的短请求
+LONG_PROMPT_CHARS = 4000
+
+def _llmPriority(content: str) -> int:
+    return LOW if len(content) > LONG_PROMPT_CHARS else NORMAL
+
+def _primaryEndpoint(model: str) -> Endpoint:
+    return Endpoint(plugin_config.chat_oneapi_url, model, plugin_config.chat_oneapi_key)
+
+async def _fetchCompletion(key: str, model: str, content: str, temperature: float, top_p: float, extra_body: dict):
+    async def create(endpoint: Endpoint):
+        # 按host熔断，router据此跳过不可用的候选
+        async with breaker_for(endpoint.base_url):
+            return await get_openai_client(endpoint.base_url, endpoint.token).chat.completions.create(
+                model=endpoint.model,
+                messages=[{"role": "user", "content": content}],
+                extra_body=extra_body,
+                temperature = temperature,
+                top_p=top_p
+            )
+
+    # 主模型慢或失败时，由router切换/对冲到 LLM_ROUTER_POOLS 中配置的备用模型
+    async with scheduler.slot("llm", _llmPriority(content)):
+        response = await llm_router.call(LLM_TASK, create, primary=_primaryEndpoint(model))
+    message = response.choices[0].message
+    if message.content:
+        await llm_cache.set(key, message.content)
+    return message
+
 async def callModel(model: str, content: str, temperature: float = 1.0, top_p: float =1.0):
-    response = await client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": content}],
-        extra_body={
-            "enable_search": True, # hy-dsr开启联网搜索
-            "thinking": {
-                "type": "enabled"
-            }
-        },
-        temperature = temperature,
-        top_p=top_p
-    )
-    return response.choices[0].message
+    return await _cachedCompletion("think", model, content, temperature, top_p, {
+        "enable_search": True, # hy-dsr开启联网搜索
+        "thinking": {
+            "type": "enabled"
+        }
+    })
+
+async def _openStream(endpoint: Endpoint, content: str, temperature: float, top_p: float):
+    """打开流式请求并等到第一段正文，返回 (第一段正文, 剩余chunk的迭代器)。
+
+    首段到达之前的失败计入熔断，调用方可以安全地切换到下一个候选。
+    """
+    async with breaker_for(endpoint.base_url):
+        stream = await get_openai_client(endpoint.base_url, endpoint.token).chat.completions.create(
+            model=endpoint.model,
+            messages=[{"role": "user", "content": content}],
+            extra_body={
+                "enable_search": True, # hy-dsr开启联网搜索
+                "thinking": {
+                    "type": "enabled"
+                }
+            },
+            temperature = temperature,
+            top_p=top_p,
+            stream=True
+        )
+        chunks = stream.__aiter__()
+        async for chunk in chunks:
+            delta = _streamDelta(chunk)
+            if delta:
+                return delta, chunks
+    return None, None
+
+def _streamDelta(chunk) -> str:
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+async def callModelStream(model: str, content: str, temperature: float = 1.0, top_p: float =1.0):
+    """callModel 的流式版本，逐段产出回复正文（不含思考过程），结束后写入缓存。
+
+    首段正文到达前失败时切换到 router 的下一个候选；耗时与错误计入 router 的统计。
+    """
+    key = _cacheKey("think", model, content, temperature, top_p)
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async with scheduler.slot("llm", _llmPriority(content)):
+        last_error = None
+        for endpoint in llm_router.candidates(LLM_TASK, _primaryEndpoint(model)):
+            start = time.monotonic()
+            try:
+                first, chunks = await _openStream(endpoint, content, temperature, top_p)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 尚未产出任何内容，可以切换到下一个候选
+                llm_router.stats(endpoint).record(time.monotonic() - start, False)
+                logger.warning(f"LLM endpoint {endpoint.name} stream failed: {e}")
+                last_error = e
+                continue
+            break
+        else:
+            raise last_error
+
+        try:
+            if first:
+                parts.append(first)
+                yield first
+            if chunks is not None:
+                async for chunk in chunks:
+                    delta = _streamDelta(chunk)
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except Exception:
+            # 已经输出了部分内容，不再切换候选
+            llm_router.stats(endpoint).record(time.monotonic() - start, False)
+            raise
+        llm_router.stats(endpoint).record(time.monotonic() - start, True)
+    if parts:
+        await llm_cache.set(key, "".join(parts))
 
 async def callModelChat(model: str, content: str, temperature: float = 1.0, top_p: float =1.0):
-    response = await client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": content}],
-        extra_body={
-            "enable_search": True # hy-dsr开启联网搜索
-        },
-        temperature = temperature,
-        top_p=top_p
-    )
-    return response.choices[0].message
+    return await _cachedCompletion("chat", model, content, temperature, top_p, {
+        "enable_search": True # hy-dsr开启联网搜索
+    })
 
 
 @conclude.handle()
@@ -202,8 +315,7 @@ async def _(bot: Bot, event: GroupMessageEvent, msg: Message = CommandArg()):
     prompt = random.choice(prompts)
 
     #response = await callModel("Pro/deepseek-ai/DeepSeek-R1", prompt)
-    response = await callModel(OFFLINE_MODEL, prompt)
-    await autoWrapMessage(bot, event, mc, "\n"+response.content, limit=400)
+    await autoWrapMessageStream(bot, event, mc, callModelStream(OFFLINE_MODEL, prompt), prefix="\n", limit=400)
 
 
 szg = on_command("丝之歌", aliases={"丝之歌体", "丝之歌式", "刘辉洲", "刘辉州", "古文小生", "szg式", "lhz式"}, priority=13, block=True)
@@ -259,8 +371,7 @@ async def _(bot: Bot, event: GroupMessageEvent, msg: Message = CommandArg()):
     prompt = prompt
 
     #response = await callModel("Pro/moonshotai/Kimi-K2-Instruct-0905", prompt)
-    response = await callModel(OFFLINE_MODEL, prompt)
-    await autoWrapMessage(bot, event, szg, response.content.strip(), limit=400)
+    await autoWrapMessageStream(bot, event, szg, callModelStream(OFFLINE_MODEL, prompt), limit=400)
 
 
 htx = on_command("何式", priority=13, block=True)
@@ -331,42 +442,56 @@ async def _(bot: Bot, event: GroupMessageEvent, msg: Message = CommandArg()):
 
 
 
-from . import xf_ocr
+from .ocr_backends import ocr_router
 ocr = on_command("ocr", priority=13, block=True)
+# 同一条消息中多张图片并发识别的上限
+OCR_CONCURRENCY = 4
+
+async def ocrImages(img_urls: list) -> list:
+    """并发识别多张图片，结果顺序与输入一致"""
+    semaphore = asyncio.Semaphore(OCR_CONCURRENCY)
+
+    async def ocrOne(img_url: str) -> str:
+        async with semaphore:
+            try:
+                return await ocr_router.recognize(img_url)
+            except Exception as e:
+                return f"Error processing image: {str(e)}"
+
+    return await asyncio.gather(*(ocrOne(img_url) for img_url in img_urls))
+
 @ocr.handle()
 async def _(bot: Bot, event: GroupMessageEvent, msg: Message = CommandArg()):
       # 检查是否包含回复信息
     if event.reply:
         # 获取被引用消息的内容
         replied_message = event.reply.message
-        for seg in replied_message:
-            if seg.type == "image":
-                img_url = seg.data["url"]
-                txt = xf_ocr.ocr(img_url)
-                if len(txt) < 30:
-                    await autoWrapMessage(bot, event, ocr, txt, limit=400)
-                else:
-                    # 将长文本分段
-                    segments = [txt[i:i+1000] for i in range(0, len(txt), 1000)]
-                    messages = []
-                    
-                    # 创建转发消息节点
-                    for index, segment in enumerate(segments, 1):
-                        messages.append({
-                            "type": "node",
-                            "data": {
-                                "name": "OCR结果",
-                                "uin": event.self_id,
-                                "content": f"第{index}部分：\n{segment}"
-                            }
-                        })
-                    
-                    # 发送合并转发消息
-                    await bot.call_api(
-                        "send_group_forward_msg",
-                        group_id=event.group_id,
-                        messages=messages
-                    )
+        img_urls = [seg.data["url"] for seg in replied_message if seg.type == "image"]
+        for txt in await ocrImages(img_urls):
+            if len(txt) < 30:
+                await ocr.send(txt, at_sender=True)
+            else:
+                # 将长文本分段
+                segments = [txt[i:i+1000] for i in range(0, len(txt), 1000)]
+                messages = []
+                
+                # 创建转发消息节点
+                for index, segment in enumerate(segments, 1):
+                    messages.append({
+                        "type": "node",
+                        "data": {
+                            "name": "OCR结果",
+                            "uin": event.self_id,
+                            "content": f"第{index}部分：\n{segment}"
+                        }
+                    })
+                
+                # 发送合并转发消息
+                await bot.call_api(
+                    "send_group_forward_msg",
+                    group_id=event.group_id,
+                    messages=messages
+                )
 
 
 
@@ -522,10 +647,10 @@ async def fetch_url_content_via_jina(url: str) -> str:
     """通过Jina AI获取网页内容"""
     try:
         jina_url = f"https://r.jina.ai/{url}"
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(jina_url)
+        async with breaker_for(jina_url):
+            response = await get_httpx_client().get(jina_url, timeout=30.0)
             response.raise_for_status()
-            return response.text
+        return response.text
     except Exception as e:
         logger.error(f"获取URL内容失败 {url}: {e}")
         return f"获取URL内容失败: {str(e)}"
@@ -7,3 +7,5 @@ class Config(BaseModel):
     chat_oneapi_url: Optional[str] = ""  # （可选）大模型中转服务商提供的中转地址，使用OpenAI官方服务不需要填写
     default_online_model: Optional[str] = "deepseek-v3.1-terminus"
     default_offline_model: Optional[str] = "openrouter/polaris-alpha"
+    llm_cache_ttl: Optional[int] = 1800  # 模型回复缓存时间（秒）
+    llm_cache_size: Optional[int] = 512  # 本地缓存的最大条目数
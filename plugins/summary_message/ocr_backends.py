@@ -0,0 +1,197 @@
+import os
+import io
+import base64
+import shutil
+import time
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from nonebot.log import logger
+
+from plugins.common import (CachedImage, LatencyStats, breaker_for, callSfVLM, image_fetcher,
+                            ocr_cache, run_blocking)
+from plugins.common.circuit_breaker import OPEN
+from . import xf_ocr
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:  # 未安装时不启用本地OCR
+    pytesseract = None
+
+
+class OcrBackend:
+    """OCR后端接口：子类实现 recognize，失败时抛出异常以便切换到下一个后端"""
+
+    name = "base"
+    # 先验延迟（秒），统计样本不足时用于排序
+    expected_latency = 5.0
+    # 能处理的最大图片字节数，None 表示不限制
+    max_bytes: Optional[int] = None
+    # 远程后端的接口地址，用于查询熔断状态；本地后端为 None
+    endpoint: Optional[str] = None
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, image: CachedImage, size: int) -> bool:
+        return self.max_bytes is None or size <= self.max_bytes
+
+    async def recognize(self, image: CachedImage) -> str:
+        raise NotImplementedError
+
+
+class XfOcrBackend(OcrBackend):
+    """讯飞印刷文字识别"""
+
+    name = "xfyun"
+    expected_latency = 1.5
+    max_bytes = xf_ocr.MAX_IMAGE_BYTES
+    endpoint = xf_ocr.URL
+
+    def supports(self, image: CachedImage, size: int) -> bool:
+        return image.content_type in xf_ocr.ALLOWED_IMAGE_TYPES and super().supports(image, size)
+
+    async def recognize(self, image: CachedImage) -> str:
+        return await xf_ocr.recognize(image.data_url.partition(",")[2])
+
+
+class SiliconFlowOcrBackend(OcrBackend):
+    """SiliconFlow 上的 DeepSeek-OCR（经 callSfVLM）"""
+
+    name = "deepseek-ocr"
+    expected_latency = 4.0
+    endpoint = "https://api.siliconflow.cn/v1"
+    model = "deepseek-ai/DeepSeek-OCR"
+    prompt = "<image>\nFree OCR."
+
+    def available(self) -> bool:
+        return bool(os.getenv("SF_API_KEY"))
+
+    async def recognize(self, image: CachedImage) -> str:
+        result = await callSfVLM(self.prompt, [image.data_url], model=self.model,
+                                 url=self.endpoint, task="ocr")
+        if not isinstance(result, str):
+            raise ValueError(f"DeepSeek-OCR 返回了无法解析的结果: {str(result)[:100]}")
+        return result.strip()
+
+
+def _tesseract(data_url: str, lang: str) -> str:
+    data = base64.b64decode(data_url.partition(",")[2])
+    with Image.open(io.BytesIO(data)) as img:
+        return pytesseract.image_to_string(img, lang=lang)
+
+
+class TesseractBackend(OcrBackend):
+    """本地 tesseract（需安装 pytesseract、Pillow 与 tesseract 可执行文件），不经过网络"""
+
+    name = "tesseract"
+    expected_latency = 0.8
+    # 大图在CPU上识别较慢，交给远程后端
+    max_bytes = 1024 * 1024
+    lang = os.getenv("TESSERACT_LANG", "chi_sim+eng")
+
+    def available(self) -> bool:
+        return pytesseract is not None and shutil.which("tesseract") is not None
+
+    async def recognize(self, image: CachedImage) -> str:
+        return (await run_blocking(_tesseract, image.data_url, self.lang)).strip()
+
+
+# 按图片大小分桶统计各后端延迟：(上限字节数, 桶名)
+SIZE_BUCKETS = ((256 * 1024, "small"), (1024 * 1024, "medium"), (None, "large"))
+
+
+def size_bucket(size: int) -> str:
+    for limit, name in SIZE_BUCKETS:
+        if limit is None or size <= limit:
+            return name
+
+
+class OcrRouter:
+    """在可用的OCR后端中，为每张图片选择当前尺寸档位下最快且健康的后端，失败时依次切换。
+
+    后端的延迟/错误率按图片尺寸分桶统计；统计样本不足时使用后端的先验延迟，
+    因此安装了本地引擎时，小图默认不走网络。识别结果按图片内容哈希缓存。
+
+    使用示例:
+        text = await ocr_router.recognize(img_url)
+    """
+
+    def __init__(self, backends: List[OcrBackend], min_samples: int = 3, max_error_rate: float = 0.5,
+                 recovery_secs: float = 120):
+        self.backends = [backend for backend in backends if backend.available()]
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.recovery_secs = recovery_secs
+        self._stats: Dict[Tuple[str, str], LatencyStats] = {}
+        logger.info(f"可用的OCR后端: {[backend.name for backend in self.backends]}")
+
+    def stats(self, backend: OcrBackend, bucket: str) -> LatencyStats:
+        key = (backend.name, bucket)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = LatencyStats()
+        return stats
+
+    def _healthy(self, backend: OcrBackend, bucket: str) -> bool:
+        if backend.endpoint and breaker_for(backend.endpoint).state == OPEN:
+            return False
+        stats = self.stats(backend, bucket)
+        if stats.samples < self.min_samples or stats.error_rate < self.max_error_rate:
+            return True
+        # 一段时间没有新的失败后重新参与排序
+        return time.monotonic() - stats.last_failure > self.recovery_secs
+
+    def _expected(self, backend: OcrBackend, bucket: str) -> float:
+        stats = self.stats(backend, bucket)
+        p50 = stats.p50 if stats.samples >= self.min_samples else None
+        return backend.expected_latency if p50 is None else p50
+
+    def candidates(self, image: CachedImage, size: int) -> List[OcrBackend]:
+        bucket = size_bucket(size)
+        usable = [backend for backend in self.backends if backend.supports(image, size)]
+        return sorted(usable, key=lambda backend: (not self._healthy(backend, bucket),
+                                                   self._expected(backend, bucket)))
+
+    async def recognize(self, img_url: str) -> str:
+        """识别图片URL中的文字；所有后端都失败时抛出最后一个异常"""
+        image = await image_fetcher.fetch(img_url)
+        cache_key = f"text:{image.digest}"
+        cached = await ocr_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        size = len(image.data_url) * 3 // 4
+        bucket = size_bucket(size)
+        candidates = self.candidates(image, size)
+        if not candidates:
+            raise ValueError("没有可处理该图片的OCR后端")
+
+        last_error: Optional[Exception] = None
+        for backend in candidates:
+            start = time.monotonic()
+            try:
+                text = await backend.recognize(image)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats(backend, bucket).record(time.monotonic() - start, False)
+                logger.warning(f"OCR后端 {backend.name} 失败: {e}")
+                last_error = e
+                continue
+            self.stats(backend, bucket).record(time.monotonic() - start, True)
+            # 空结果可能是后端偶发识别失败，不缓存，下次仍重新识别
+            if text.strip():
+                await ocr_cache.set(cache_key, text)
+            return text
+        raise last_error
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            f"{name}/{bucket}": {"p50": stats.p50, "error_rate": stats.error_rate, "samples": stats.samples}
+            for (name, bucket), stats in self._stats.items()
+        }
+
+
+ocr_router = OcrRouter([TesseractBackend(), XfOcrBackend(), SiliconFlowOcrBackend()])
@@ -7,7 +7,6 @@
   @author iflytek
 """
 #-*- coding: utf-8 -*-
-import requests
 import time
 import hashlib
 import base64
@@ -40,49 +39,35 @@ def getHeader():
         'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8',
     }
     return header
-import requests
-import base64
+from plugins.common import get_httpx_client, breaker_for
 
-def image_url_to_base64(image_url: str) -> str:
-    """
-    输入一个图片URL，下载图片并返回其 base64 编码后的字符串
-    """
-    response = requests.get(image_url)
-    if response.status_code == 200:
-        encoded = base64.b64encode(response.content)
-        return encoded.decode('utf-8')
-    else:
-        raise Exception(f"无法获取图片，状态码: {response.status_code}")
+# base64编码并urlencode后不超过4M，原图约3M以内；仅支持jpg/png/bmp
+MAX_IMAGE_BYTES = 3 * 1024 * 1024
+ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/bmp"}
 
-def ocr(url: str) -> str:
+class OcrError(Exception):
+    """讯飞接口返回了错误码"""
+
+async def recognize(base64_str: str) -> str:
     """
-    Perform OCR on an image from a given URL.
-    
-    Args:
-        url (str): The URL of the image to process
-        
-    Returns:
-        str: The OCR result text
+    识别base64编码的图片，返回按行拼接的文本；接口返回错误码时抛出 OcrError
     """
-    try:
-        base64_str = image_url_to_base64(url)
-        data = {
-            'image': base64_str
-        }
-        r = requests.post(URL, data=data, headers=getHeader())
-        result = str(r.content, 'utf-8')
-        # Parse the JSON result to extract just the text
-        json_result = json.loads(result)
-        if json_result['code'] == '0':
-            # Extract and join all text blocks from the result
-            text_blocks = []
-            for block in json_result['data']['block']:
-                for line in block['line']:
-                    text_blocks.append(line['word'][0]['content'])
-            return '\n'.join(text_blocks)
-        return f"OCR Error: {json_result['desc']}"
-    except Exception as e:
-        return f"Error processing image: {str(e)}"
+    data = {
+        'image': base64_str
+    }
+    async with breaker_for(URL):
+        r = await get_httpx_client().post(URL, data=data, headers=getHeader())
+        result = r.text
+    # Parse the JSON result to extract just the text
+    json_result = json.loads(result)
+    if json_result['code'] != '0':
+        raise OcrError(json_result['desc'])
+    # Extract and join all text blocks from the result
+    text_blocks = []
+    for block in json_result['data']['block']:
+        for line in block['line']:
+            text_blocks.append(line['word'][0]['content'])
+    return '\n'.join(text_blocks)
 
 
 # 错误码链接：https://www.xfyun.cn/document/error-code (code返回错误码时必看)
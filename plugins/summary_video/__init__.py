@@ -1,10 +1,11 @@
-from nonebot import get_plugin_config, on_command, logger
+from nonebot import get_plugin_config, get_driver, on_command, logger
 from nonebot.plugin import PluginMetadata
-from nonebot.adapters.onebot.v11 import Message, MessageSegment
+from nonebot.adapters.onebot.v11 import Bot, Message, MessageSegment
 from nonebot.params import CommandArg
 
-from plugins.common import limiter, callDoubaoVideo
+from plugins.common import async_limiter, createDoubaoVideoTask, scheduler, SchedulerBusy
 from .config import Config
+from .jobs import video_jobs
 
 __plugin_meta__ = PluginMetadata(
     name="summary_video",
@@ -14,14 +15,25 @@ __plugin_meta__ = PluginMetadata(
 )
 
 
+# 同时进行中的视频任务上限
+MAX_PENDING_JOBS = 4
+
+# 后台worker负责轮询任务并发送结果，启动时恢复重启前未完成的任务
+get_driver().on_startup(video_jobs.start)
+get_driver().on_shutdown(video_jobs.stop)
+
 aivideo = on_command("aivideo", priority=5, block=True)
 
 @aivideo.handle()
-async def handle_aivideo(args: Message = CommandArg(), event=None):
+async def handle_aivideo(bot: Bot, args: Message = CommandArg(), event=None):
     user_id = str(event.user_id)
     
+    # 进行中的任务过多时直接回复繁忙（在限额检查之前，不消耗次数）
+    if await video_jobs.count() >= MAX_PENDING_JOBS:
+        raise SchedulerBusy("video")
+
     # Rate limiting: 8 times per day (1440 minutes)
-    if not limiter.check("aivideo", "*", 1440, 5):
+    if not await async_limiter.check("aivideo", "*", 1440, 5):
         await aivideo.finish("今日视频生成次数已达上限（5次/天）")
 
     prompt = args.extract_plain_text().strip()
@@ -36,11 +48,13 @@ async def handle_aivideo(args: Message = CommandArg(), event=None):
             
     image_url = image_urls[0] if image_urls else None
     
-    await aivideo.send("视频生成中，请稍候（约需1-3分钟）...")
-    
-    try:
-        video_url = await callDoubaoVideo(prompt, image_url=image_url)
-        await aivideo.finish(MessageSegment.video(video_url))
-    except Exception as e:
-        logger.error(f"Video generation failed: {e}")
-        await aivideo.finish(f"视频生成失败: {e}")
+    # 只占用槽位提交任务，生成过程由后台worker跟踪，完成后发到群里
+    async with scheduler.slot("video"):
+        try:
+            task_id = await createDoubaoVideoTask(prompt, image_url=image_url)
+        except Exception as e:
+            logger.error(f"Video generation failed: {e}")
+            await aivideo.finish(f"视频生成失败: {e}")
+
+    await video_jobs.submit(task_id, bot.self_id, getattr(event, "group_id", None), event.user_id, prompt)
+    await aivideo.finish("视频生成中，完成后会发送到群里（约需1-3分钟）")
@@ -0,0 +1,189 @@
+import json
+import time
+import asyncio
+from typing import Dict, List, Optional
+
+import nonebot
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+from plugins.common import getDoubaoVideoTask, listDoubaoVideoTasks, extractDoubaoVideoUrl, Backoff, record_poll
+from plugins.common import ApiStatusError, CircuitOpenError
+from plugins.common.redis_client import get_async_redis_client
+
+
+JOBS_KEY = "video_jobs"
+# 超过该时间仍未完成的任务视为超时
+JOB_DEADLINE = 30 * 60
+
+
+class VideoJobQueue:
+    """豆包视频生成任务队列：任务id持久化到Redis，由单个后台worker批量查询状态，
+    完成后把结果发送到发起的群（或私聊）。bot重启后会从Redis恢复未完成的任务。
+
+    Redis不可用时退化为进程内字典，重启后任务丢失。
+
+    使用示例:
+        await video_jobs.submit(task_id, self_id, group_id, user_id, prompt)
+    """
+
+    def __init__(self, key: str = JOBS_KEY, min_interval: float = 5, max_interval: float = 30,
+                 deadline: float = JOB_DEADLINE):
+        self.key = key
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.deadline = deadline
+        self._local: Dict[str, str] = {}
+        # 每个任务被查询的次数，仅用于统计
+        self._attempts: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def _load(self) -> Dict[str, dict]:
+        client = get_async_redis_client()
+        raw = self._local
+        if client is not None:
+            try:
+                raw = await client.hgetall(self.key)
+            except Exception as e:
+                logger.warning(f"Redis hgetall error: {e}")
+        return {task_id: json.loads(value) for task_id, value in raw.items()}
+
+    async def _save(self, job: dict):
+        value = json.dumps(job, ensure_ascii=False)
+        self._local[job["task_id"]] = value
+        client = get_async_redis_client()
+        if client is not None:
+            try:
+                await client.hset(self.key, job["task_id"], value)
+            except Exception as e:
+                logger.warning(f"Redis hset error: {e}")
+
+    async def _remove(self, task_id: str):
+        self._local.pop(task_id, None)
+        client = get_async_redis_client()
+        if client is not None:
+            try:
+                await client.hdel(self.key, task_id)
+            except Exception as e:
+                logger.warning(f"Redis hdel error: {e}")
+
+    async def count(self) -> int:
+        return len(await self._load())
+
+    async def submit(self, task_id: str, self_id: str, group_id: Optional[int], user_id: int, prompt: str):
+        await self._save({
+            "task_id": task_id,
+            "self_id": self_id,
+            "group_id": group_id,
+            "user_id": user_id,
+            "prompt": prompt[:100],
+            "created_at": time.time(),
+        })
+        self._wakeup.set()
+
+    async def _deliver(self, job: dict, message: Message):
+        bot = nonebot.get_bot(job["self_id"])
+        if job.get("group_id"):
+            await bot.send_group_msg(group_id=job["group_id"], message=MessageSegment.at(job["user_id"]) + message)
+        else:
+            await bot.send_private_msg(user_id=job["user_id"], message=message)
+
+    async def _fetch(self, task_ids: List[str]) -> Dict[str, dict]:
+        """查询任务状态。限流（429）、熔断或服务端故障时直接抛出，由 run 退避，
+        只有批量接口拒绝请求本身（其他4xx）时才逐个查询"""
+        try:
+            # 一次请求查询所有未完成任务
+            return await listDoubaoVideoTasks(task_ids)
+        except ApiStatusError as e:
+            if e.status == 429:
+                raise
+            logger.warning(f"批量查询视频任务失败，逐个查询: {e}")
+        results = {}
+        for task_id in task_ids:
+            try:
+                results[task_id] = await getDoubaoVideoTask(task_id)
+            except ApiStatusError as e:
+                if e.status == 429:
+                    raise
+                logger.warning(f"查询视频任务 {task_id} 失败: {e}")
+        return results
+
+    async def poll_once(self) -> bool:
+        """查询一轮所有任务，返回本轮是否有任务结束"""
+        jobs = await self._load()
+        if not jobs:
+            return False
+        results = await self._fetch(list(jobs))
+        changed = False
+        for task_id, job in jobs.items():
+            message = None
+            self._attempts[task_id] = self._attempts.get(task_id, 0) + 1
+            try:
+                video_url = extractDoubaoVideoUrl(results[task_id]) if task_id in results else None
+                if video_url:
+                    message = Message(MessageSegment.video(video_url))
+                    outcome = "done"
+                elif time.time() - job["created_at"] > self.deadline:
+                    message = Message(f"视频生成超时: {job['prompt']}")
+                    outcome = "timeout"
+            except Exception as e:
+                logger.error(f"Video generation failed: {e}")
+                message = Message(f"视频生成失败: {e}")
+                outcome = "error"
+            if message is None:
+                continue
+            try:
+                await self._deliver(job, message)
+            except Exception as e:
+                # bot未连接等情况，保留任务下一轮重试
+                logger.warning(f"视频任务 {task_id} 结果发送失败: {e}")
+                continue
+            await self._remove(task_id)
+            record_poll("doubao_video_job", time.time() - job["created_at"], self._attempts.pop(task_id, 0), outcome)
+            changed = True
+        return changed
+
+    async def run(self):
+        backoff = Backoff(initial=self.min_interval, factor=1.5, max_interval=self.max_interval)
+        while True:
+            if not await self.count():
+                await self._wakeup.wait()
+            if self._wakeup.is_set():
+                # 有新任务提交（包括上一轮等待期间提交的），从最短间隔重新开始
+                backoff.reset()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff.next())
+            except asyncio.TimeoutError:
+                pass
+            try:
+                changed = await self.poll_once()
+            except (ApiStatusError, CircuitOpenError) as e:
+                # 被限流或后端不可用：至少等待服务端给出的 Retry-After，期间不因新任务提前查询
+                delay = max(e.retry_after or 0, backoff.next())
+                logger.warning(f"视频任务查询受限，{delay:.0f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+                changed = False
+            except Exception as e:
+                logger.error(f"视频任务轮询出错: {e}")
+                changed = False
+            # 没有任务结束时逐渐拉长轮询间隔
+            if changed:
+                backoff.reset()
+
+    async def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+
+video_jobs = VideoJobQueue()
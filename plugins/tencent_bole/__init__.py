@@ -1,11 +1,14 @@
 from nonebot import on_message
 from nonebot.adapters.onebot.v11 import GroupMessageEvent, MessageSegment
 from nonebot.plugin import PluginMetadata
+from nonebot.typing import T_State
 from datetime import datetime
 import json
 import os
 from pathlib import Path
 
+from plugins.common import MessageFeatures, PREFILTER_KEY, prefilter, prefilter_rule, run_blocking
+
 # 插件元信息
 __plugin_meta__ = PluginMetadata(
     name="内推自动机",
@@ -35,48 +38,56 @@ def save_state(state):
     with open(STATE_FILE, "w", encoding="utf-8") as f:
         json.dump(state, f, ensure_ascii=False, indent=2)
 
+# 启动时加载一次，之后只在触发时写回文件：群号 -> 最近触发日期
+goose_state = load_state()
+
+# 触发词按回复类型登记到共享预筛选，按顺序取第一个命中的
+TRIGGERS = [
+    ("bole.tencent", ["鹅", "腾讯", "宇宙厂"]),
+    ("bole.bytedance", ["bytedance", "字节跳动", "火山引擎"]),
+    ("bole.botgroup", ["bot群"]),
+]
+for tag, keywords in TRIGGERS:
+    prefilter.register(tag, keywords)
+
+def goose_triggered(features: MessageFeatures) -> bool:
+    """今天尚未触发过的群里出现触发词时才唤醒处理器"""
+    if features.group_id is None:
+        return False
+    if goose_state.get(features.group_id) == datetime.now().strftime("%Y-%m-%d"):
+        return False
+    return any(features.hit(tag) for tag, _ in TRIGGERS)
+
 # 消息事件处理器
-goose_matcher = on_message(priority=10, block=False)
+goose_matcher = on_message(rule=prefilter_rule(goose_triggered), priority=10, block=False)
 
 @goose_matcher.handle()
-async def handle_goose(event: GroupMessageEvent):
-    text = event.get_plaintext()
+async def handle_goose(event: GroupMessageEvent, state: T_State):
+    features: MessageFeatures = state[PREFILTER_KEY]
 
     # 获取当前日期
     today = datetime.now().strftime("%Y-%m-%d")
 
-    # 加载状态
-    state = load_state()
-
     # 检查该群今天是否已经触发过
     group_id = str(event.group_id)
-    if group_id in state and state[group_id] == today:
+    if goose_state.get(group_id) == today:
         return
-    
 
-    # 检查消息是否包含"鹅"
-    if "鹅" in text or "腾讯" in text or "宇宙厂" in text:
-        # 更新状态
-        state[group_id] = today
-        save_state(state)
+    # 更新状态
+    goose_state[group_id] = today
+    await run_blocking(save_state, dict(goose_state))
 
+    if features.hit("bole.tencent"):
         # 发送图片
         # 这里替换为你要发送的图片路径或URL
         image_path = "https://7s-1304005994.cos.ap-singapore.myqcloud.com/tencent_bole.png"  # 本地文件路径
         img = MessageSegment.image(image_path)
 
         await goose_matcher.finish(img)
-    elif "bytedance" in text.lower() or "字节跳动" in text or "火山引擎" in text:
-        state[group_id] = today
-        save_state(state)
-
+    elif features.hit("bole.bytedance"):
         image_path = "/root/nb/resources/zijie_neitui.png"  # 本地文件路径
         img = MessageSegment.image(image_path)
 
         await goose_matcher.finish(img)
-    elif "bot群" in text:
-        state[group_id] = today
-        save_state(state)
-
+    elif features.hit("bole.botgroup"):
         await goose_matcher.finish("玩刷屏游戏的话，可以进群 1030307936 （https://qm.qq.com/q/Zinx0Q7HOK）")
-        
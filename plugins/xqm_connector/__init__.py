@@ -41,7 +41,6 @@ def wrapMessageForward(title: str, texts: List[str]):
         })
     return msgs
 import httpx
-import base64
 
 
 
@@ -50,18 +49,9 @@ async def get_image_data_uri(image_url: str) -> str:
     从图片URL获取图片数据并转换为data URI
     """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(image_url)
-            response.raise_for_status()
-            
-        # 转换为base64
-        image_data = base64.b64encode(response.content).decode('utf-8')
-        
-        # 获取图片格式
-        content_type = response.headers.get('content-type', 'image/jpeg')
-        
-        # 返回data URI
-        return f"data:{content_type};base64,{image_data}"
+        # 流式下载，超过大小上限或类型不符时立即中断
+        image = await download_image(image_url)
+        return image.data_url
     except Exception as e:
         print(f"获取图片失败: {e}")
         return None
@@ -83,7 +73,7 @@ async def check_forbidden(command, event: MessageEvent, msg: Message):
         await command.finish("xqm是大坏蛋；此命令已被禁止使用")
         raise ValueError("xqm是大坏蛋；此命令已被禁止使用")
 
-from plugins.common import extract_image_data_url, extract_text
+from plugins.common import extract_image_data_url, extract_text, get_httpx_client, breaker_for, download_image
 xqm = on_command("xqm", priority=102, block=True)
 import requests
 import re
@@ -110,15 +100,15 @@ async def _(bot: Bot, event: MessageEvent, msg: Message = CommandArg()):
     print("xqm param:", param)
     response = None
     try:
-        async with httpx.AsyncClient(timeout=600, http2=True) as client:
-            response = await client.post(url, data=param)
+        async with breaker_for(url):
+            response = await get_httpx_client().post(url, data=param, timeout=600)
             response.raise_for_status()
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 502:
             # 502错误重试一次
             try:
-                async with httpx.AsyncClient(timeout=600, http2=True) as client:
-                    response = await client.post(url, data=param)
+                async with breaker_for(url):
+                    response = await get_httpx_client().post(url, data=param, timeout=600)
                     response.raise_for_status()
             except Exception as retry_e:
                 await xqm.send(str(retry_e)[:18] + "...")
@@ -148,10 +138,10 @@ async def _(bot: Bot, event: MessageEvent, msg: Message = CommandArg()):
         await bot.call_api("send_group_forward_msg", group_id=event.group_id, messages=msgs)
 
 async def fetchGuyuRooms(url: str):
-    async with httpx.AsyncClient(timeout=10) as client:
-        response = await client.get(url)
+    async with breaker_for(url):
+        response = await get_httpx_client().get(url, timeout=10)
         response.raise_for_status()  # 检查 HTTP 状态码
-        data = response.json()
+    data = response.json()
     results = ""
     for item in data:
         room_id = item.get('id')
@@ -0,0 +1,4 @@
+import nonebot
+
+# plugins.common 在导入时读取插件配置并注册 shutdown 钩子，需要先初始化 nonebot
+nonebot.init()
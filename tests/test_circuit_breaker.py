@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from plugins.common import callSFImg as sf
+from plugins.common import circuit_breaker
+
+
+class FakeResponse:
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise FakeHttpError(self.status)
+
+    async def text(self):
+        return self.body
+
+
+class FakeHttpError(Exception):
+    """与 aiohttp.ClientResponseError 一样带 status 属性"""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    async def __aenter__(self):
+        return self.response
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def request(self, method, url, **kwargs):
+        return FakeRequest(self.responses.pop(0))
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    circuit_breaker._breakers.clear()
+    yield
+    circuit_breaker._breakers.clear()
+
+
+def use_responses(monkeypatch, responses):
+    session = FakeSession(responses)
+    monkeypatch.setattr(sf, "get_aiohttp_session", lambda: session)
+
+
+def test_client_errors_keep_breaker_closed(monkeypatch):
+    url = "https://api.siliconflow.cn/v1/images/generations"
+    bodies = [
+        (400, '{"error": "invalid prompt"}'),
+        (401, '{"error": "invalid token"}'),
+        (403, "forbidden"),
+        (422, '{"message": "content rejected"}'),
+        (429, '{"error": "rate limited"}'),
+    ]
+    responses = [FakeResponse(status, body) for status, body in bodies] * 2
+    use_responses(monkeypatch, responses)
+
+    for status, _ in bodies * 2:
+        with pytest.raises(sf.ApiStatusError) as excinfo:
+            asyncio.run(sf.callSFImg("a cat"))
+        assert excinfo.value.status == status
+
+    assert circuit_breaker.breaker_for(url).state == circuit_breaker.CLOSED
+
+
+def test_retry_after_is_exposed(monkeypatch):
+    use_responses(monkeypatch, [FakeResponse(429, "{}", {"Retry-After": "7"})])
+
+    with pytest.raises(sf.ApiStatusError) as excinfo:
+        asyncio.run(sf.getDoubaoVideoTask("task"))
+    assert excinfo.value.retry_after == 7
+
+
+def test_invalid_body_keeps_breaker_closed(monkeypatch):
+    url = "https://api.siliconflow.cn/v1/images/generations"
+    use_responses(monkeypatch, [FakeResponse(200, "<html>bad gateway page</html>")] * 10)
+
+    for _ in range(10):
+        with pytest.raises(ValueError):
+            asyncio.run(sf.callSFImg("a cat"))
+
+    assert circuit_breaker.breaker_for(url).state == circuit_breaker.CLOSED
+
+
+def test_server_errors_open_breaker(monkeypatch):
+    url = "https://api.siliconflow.cn/v1/images/generations"
+    threshold = circuit_breaker.breaker_for(url).failure_threshold
+    use_responses(monkeypatch, [FakeResponse(503, "unavailable")] * threshold)
+
+    for _ in range(threshold):
+        with pytest.raises(FakeHttpError):
+            asyncio.run(sf.callSFImg("a cat"))
+
+    assert circuit_breaker.breaker_for(url).state == circuit_breaker.OPEN